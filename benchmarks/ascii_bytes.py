@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""Compares lexing an ASCII notebook as str (read, decode, get_tokens_unprocessed) against lexing
+the bytes of its mmap with lex_bytes.
+
+Usage: python benchmarks/ascii_bytes.py [--size MB] [notebook]
+
+Without a notebook, an ASCII notebook of the given size is generated. Each path runs in a fresh
+process, which reports the time taken and its peak resident memory.
+"""
+
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+CELLS = r'''Cell[CellGroupData[{{
+Cell["Section {0}", "Section"],
+Cell[BoxData[
+ RowBox[{{
+  RowBox[{{"f{0}", "[", RowBox[{{"x_", ",", " ", "y_"}}], "]"}}], ":=",
+  RowBox[{{"Module", "[", RowBox[{{RowBox[{{"{{", RowBox[{{"z", "=", "x"}}], "}}"}}], ",",
+   RowBox[{{SuperscriptBox["z", "2"], "+", "\[Alpha]", "+", "y"}}]}}], "]"}}]}}]], "Input",
+ CellLabel->"In[{0}]:="],
+Cell[BoxData[SuperscriptBox["\[Alpha]", "\:03b2"]], "Output", CellLabel->"Out[{0}]="]
+}}, Open  ]],
+'''
+
+
+def generate(path, size):
+    with open(path, 'w', encoding='ascii') as f:
+        f.write('Notebook[{\n')
+        written = i = 0
+        while written < size:
+            cell = CELLS.format(i)
+            f.write(cell)
+            written += len(cell)
+            i += 1
+        f.write('Cell["end", "Text"]\n}, WindowSize->{808, 911}]\n')
+
+
+def run(mode, path):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    import mmap
+    from mathematica.lexer import MathematicaLexer
+    from mathematica.stream import lex_bytes
+
+    start = time.time()
+    if mode == 'str':
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        count = sum(1 for _ in MathematicaLexer().get_tokens_unprocessed(text))
+    else:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        count = sum(1 for _ in lex_bytes(data))
+
+    elapsed = time.time() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print('{:>6}: {:,} tokens in {:7.1f} s  ({:.2f} MB/s)  peak RSS {:7.1f} MB'.format(
+        mode, count, elapsed, os.path.getsize(path) / elapsed / 1e6, peak))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=float, default=100)
+    parser.add_argument('--mode', choices=('str', 'bytes'))
+    parser.add_argument('notebook', nargs='?')
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.notebook)
+        return
+
+    path = args.notebook
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.nb')
+        os.close(fd)
+        generate(path, int(args.size * 1e6))
+
+    try:
+        print('{}: {:.1f} MB'.format(path, os.path.getsize(path) / 1e6))
+        for mode in ('str', 'bytes'):
+            subprocess.check_call([sys.executable, __file__, '--mode', mode, path])
+    finally:
+        if args.notebook is None:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""Compares highlighting snippets by starting a Python process for each (as pygments.rb, editors
+and other clients do without a daemon) against sending them to a running highlight daemon.
+
+Usage: python benchmarks/daemon_latency.py [--snippets N] [--workers N]
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNIPPET = 'f{0}[x_, y_] := Module[{{z = x + {0}}}, z^2 + y] (* {0} *)'
+
+HIGHLIGHT = '''import sys
+sys.path.insert(0, {root!r})
+import pygments
+from pygments.formatters import HtmlFormatter
+from mathematica import MathematicaLexer
+sys.stdout.write(pygments.highlight(sys.stdin.read(), MathematicaLexer(), HtmlFormatter()))
+'''.format(root=ROOT)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p / 100.0 * len(values)))]
+
+
+def report(name, latencies):
+    print('{:>20}: median {:7.1f} ms, p99 {:7.1f} ms, {:7.1f} snippets/s'.format(
+        name, percentile(latencies, 50) * 1000, percentile(latencies, 99) * 1000,
+        len(latencies) / sum(latencies)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snippets', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    snippets = [SNIPPET.format(i) for i in range(args.snippets)]
+
+    latencies = []
+    for code in snippets[:20]:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', HIGHLIGHT], input=code.encode('utf-8'),
+                       stdout=subprocess.PIPE, check=True)
+        latencies.append(time.perf_counter() - start)
+    report('process per snippet', latencies)
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'socket')
+    daemon = subprocess.Popen([sys.executable, '-m', 'mathematica.server', 'serve', '--socket',
+                               path, '--workers', str(args.workers)], cwd=ROOT,
+                              stderr=subprocess.PIPE)
+    try:
+        # The daemon reports that it is listening once its workers are ready
+        daemon.stderr.readline()
+        client = socket.socket(socket.AF_UNIX)
+        client.connect(path)
+        responses = client.makefile('rb')
+
+        latencies = []
+        for i, code in enumerate(snippets):
+            start = time.perf_counter()
+            client.sendall(json.dumps({'id': i, 'code': code}).encode('utf-8') + b'\n')
+            json.loads(responses.readline())
+            latencies.append(time.perf_counter() - start)
+        report('daemon, one by one', latencies)
+
+        start = time.perf_counter()
+        client.sendall(b''.join(json.dumps({'id': i, 'code': code}).encode('utf-8') + b'\n'
+                                for i, code in enumerate(snippets)))
+        timings = [json.loads(responses.readline())['timing'] for _ in snippets]
+        elapsed = time.perf_counter() - start
+        print('{:>20}: {:7.1f} snippets/s, median highlight {:.2f} ms'.format(
+            'daemon, pipelined', len(snippets) / elapsed,
+            percentile([timing['highlight_ms'] for timing in timings], 50)))
+        client.close()
+    finally:
+        daemon.terminate()
+        daemon.wait()
+        if os.path.exists(path):
+            os.unlink(path)
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""Measures how long the event loop is blocked while a large snippet is lexed or highlighted.
+
+Usage: python benchmarks/event_loop_latency.py [--size KB]
+
+A ticker task sleeps for 1 ms at a time and records how late it wakes up, while the snippet is
+lexed inline, with alex, and highlighted with ahighlight in a thread and a process pool.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pygments.formatters import HtmlFormatter  # noqa: E402
+
+from mathematica.aio import ahighlight, alex  # noqa: E402
+from mathematica.lexer import MathematicaLexer  # noqa: E402
+
+SNIPPET = '''f[x_, y_] := Module[{z = x + 1}, z^2 + y] (* comment *)
+Plot[Sin[x], {x, 0, 2 Pi}, PlotStyle -> Red]
+'''
+
+
+async def measure(work):
+    stalls = []
+    done = False
+
+    async def ticker():
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - start - 0.001)
+
+    task = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await work()
+    elapsed = time.perf_counter() - start
+    done = True
+    await task
+    return elapsed, max(stalls)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=200)
+    args = parser.parse_args()
+
+    text = SNIPPET * (args.size * 1024 // len(SNIPPET))
+    formatter = HtmlFormatter()
+
+    async def inline():
+        list(MathematicaLexer().get_tokens_unprocessed(text))
+
+    async def async_lex():
+        async for _ in alex(text):
+            pass
+
+    thread_pool = ThreadPoolExecutor(1)
+    process_pool = ProcessPoolExecutor(1)
+    # Starts the worker process before measuring
+    process_pool.submit(len, '').result()
+
+    async def in_thread():
+        await ahighlight(text, formatter, executor=thread_pool, threshold=0)
+
+    async def in_process():
+        await ahighlight(text, formatter, executor=process_pool, threshold=0)
+
+    print('{} KB snippet'.format(len(text) // 1024))
+    for name, work in (('inline', inline), ('alex', async_lex), ('ahighlight thread', in_thread),
+                       ('ahighlight process', in_process)):
+        elapsed, stall = asyncio.run(measure(work))
+        print('{:>18}: {:6.2f} s, longest stall {:8.1f} ms'.format(name, elapsed, stall * 1000))
+
+    thread_pool.shutdown()
+    process_pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""Compares highlighting many small snippets one at a time with pygments.highlight against
+highlight_many, the way a static site generator highlights the code blocks of a site.
+
+Usage: python benchmarks/highlight_many.py [--snippets N] [--duplicates FRACTION] [--workers N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygments  # noqa: E402
+from pygments.formatters import HtmlFormatter  # noqa: E402
+
+from mathematica.lexer import MathematicaLexer  # noqa: E402
+from mathematica.parallel import highlight_many, get_pool, shutdown_pool  # noqa: E402
+from mathematica.style import MathematicaStyle  # noqa: E402
+
+TEMPLATES = [
+    'f{0}[x_, y_] := Module[{{z = x + {0}}}, z^2 + y]',
+    'Plot[Sin[{0} x], {{x, 0, 2 Pi}}, PlotStyle -> Red]',
+    'data{0} = Table[{{i, RandomReal[]}}, {{i, {0}}}];\nListPlot[data{0}]',
+    '(* step {0} *)\nNest[#^2 &, {0}, 3] // N',
+    'Association["a" -> {0}, "b" -> <|"c" -> {{1, 2, 3}}|>]',
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--snippets', type=int, default=20000)
+    parser.add_argument('--duplicates', type=float, default=0.2)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    random.seed(0)
+    snippets = [random.choice(TEMPLATES).format(i) for i in range(args.snippets)]
+    for i in range(int(args.duplicates * len(snippets))):
+        snippets[random.randrange(len(snippets))] = snippets[i]
+
+    formatter = HtmlFormatter(style=MathematicaStyle)
+    lexer = MathematicaLexer()
+    start = time.time()
+    expected = [pygments.highlight(code, lexer, formatter) for code in snippets]
+    serial = time.time() - start
+    print('pygments.highlight:          {:6.2f} s'.format(serial))
+
+    start = time.time()
+    get_pool(args.workers)
+    results = list(highlight_many(snippets, formatter, workers=args.workers))
+    elapsed = time.time() - start
+    assert results == expected
+    print('highlight_many, {:2} workers:  {:6.2f} s  (cold pool, {:.2f}x)'.format(
+        args.workers, elapsed, serial / elapsed))
+
+    start = time.time()
+    results = list(highlight_many(snippets, formatter, workers=args.workers))
+    elapsed = time.time() - start
+    print('highlight_many, {:2} workers:  {:6.2f} s  (warm pool, {:.2f}x)'.format(
+        args.workers, elapsed, serial / elapsed))
+    shutdown_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""Measures the resident memory of a full token list with and without the intern option.
+
+Usage: python benchmarks/intern_memory.py [--size MB] [file ...]
+
+The corpus is made of the given files (or a sample package) repeated up to the given size. Each
+measurement runs in a fresh process and reports the growth in resident memory while holding the
+token list, excluding the corpus text itself.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+SAMPLE = '''BeginPackage["Sample`"]
+
+lissajous::usage = "An example Lissajous curve."
+
+Begin["`Private`"]
+
+lissajous[a_Integer, b_Integer, t_] := {Sin[a t + Pi/2], Sin[b t]}
+
+plotCurves[pairs_List] := Module[{curves = lissajous @@@ pairs, max = 2 Pi},
+    ParametricPlot[Evaluate[#[t] & /@ curves], {t, 0, max}] /. x_Line :> {Dashed, x}
+]
+
+(* A comment, which is a single token *)
+total[data_] := With[{n = Length[data]}, Total[data] / n]
+
+End[]
+
+EndPackage[]
+'''
+
+
+def rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError('VmRSS is only available on Linux')
+
+
+def measure(corpus_path, intern):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from mathematica.lexer import MathematicaLexer
+
+    with open(corpus_path, encoding='utf-8') as f:
+        text = f.read()
+
+    lexer = MathematicaLexer(intern=intern)
+    list(lexer.get_tokens_unprocessed('warm up'))
+    before = rss()
+    tokens = list(lexer.get_tokens_unprocessed(text))
+    after = rss()
+    print('{:>10} tokens: {:>9,}  RSS growth: {:>8.1f} MB  ({:.1f} bytes/token)'.format(
+        'intern' if intern else 'default', len(tokens), (after - before) / 2 ** 20,
+        (after - before) / len(tokens)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=float, default=50, help='corpus size in MB')
+    parser.add_argument('--measure', choices=['default', 'intern'], help=argparse.SUPPRESS)
+    parser.add_argument('--corpus', help=argparse.SUPPRESS)
+    parser.add_argument('files', nargs='*')
+    args = parser.parse_args()
+
+    if args.measure:
+        measure(args.corpus, args.measure == 'intern')
+        return
+
+    source = ''.join(open(path, encoding='utf-8').read() for path in args.files) or SAMPLE
+    corpus_path = 'intern_memory_corpus.m'
+    with open(corpus_path, 'w', encoding='utf-8') as f:
+        f.write(source * max(1, int(args.size * 2 ** 20 / len(source))))
+
+    try:
+        print('corpus: {:.1f} MB'.format(os.path.getsize(corpus_path) / 2 ** 20))
+        for mode in ('default', 'intern'):
+            subprocess.check_call([sys.executable, __file__, '--measure', mode,
+                                   '--corpus', corpus_path])
+    finally:
+        os.remove(corpus_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""Compares lexing a notebook as a whole against lexing only its code cells with lex_notebook,
+and measures the time taken to scan and index its cells, to highlight it again with
+rehighlight_notebook after one of its cells has changed, and to flatten a cell of 400,000 boxes.
+
+Usage: python benchmarks/notebook_cells.py [--size MB] [--workers N] [notebook]
+
+Without a notebook, one of the given size is generated, with the mix of a typical notebook that
+plots things: small input cells, and outputs made of graphics and CompressedData.
+"""
+
+import argparse
+import base64
+import mmap
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pygments.formatters import HtmlFormatter  # noqa: E402
+
+from mathematica.cache import DiskCache  # noqa: E402
+from mathematica.lexer import MathematicaLexer  # noqa: E402
+from mathematica.notebook import (flatten_boxes, index_cells, lex_notebook,  # noqa: E402
+                                  rehighlight_notebook, scan_cells)
+from mathematica.parallel import shutdown_pool  # noqa: E402
+
+CELLS = r'''Cell[CellGroupData[{{
+Cell["Plot {0}", "Subsection"],
+Cell[BoxData[
+ RowBox[{{"Plot", "[", RowBox[{{RowBox[{{"Sin", "[", RowBox[{{"{0}", " ", "x"}}], "]"}}], ",",
+  RowBox[{{"{{", RowBox[{{"x", ",", "0", ",", RowBox[{{"2", "Pi"}}]}}], "}}"}}]}}], "]"}}]], "Input",
+ CellLabel->"In[{0}]:="],
+Cell[BoxData[
+ GraphicsBox[{{{{{{}}, {{}}, {{RGBColor[0.368417, 0.506779, 0.709798], AbsoluteThickness[1.6],
+   LineBox[{{{points}}}]}}}}}}, {{}}}},
+  AspectRatio->NCache[GoldenRatio^(-1), 0.6180339887498948], Axes->{{True, True}},
+  ImageSize->{{360, 222}}]], "Output",
+ CellLabel->"Out[{0}]="],
+Cell[BoxData[
+ GraphicsBox[RasterBox[CompressedData["
+{compressed}
+"], {{{{0, 200}}, {{300, 0}}}}, {{0, 255}}, ColorFunction->RGBColor]]], "Output"],
+Cell["Some text about plot {0} with a [bracket] and \"quotes\".", "Text"]
+}}, Open  ]],
+'''
+
+
+def generate(path, size):
+    random.seed(0)
+    with open(path, 'w', encoding='ascii') as f:
+        f.write('(* Content-type: application/vnd.wolfram.mathematica *)\n\nNotebook[{\n')
+        written = i = 0
+        while written < size:
+            points = ', '.join('{{{:.6f}, {:.6f}}}'.format(x / 100.0, random.random())
+                               for x in range(400))
+            compressed = base64.b64encode(os.urandom(30000)).decode('ascii')
+            compressed = '\n'.join(compressed[j:j + 76] for j in range(0, len(compressed), 76))
+            cell = CELLS.format(i, points=points, compressed=compressed)
+            f.write(cell)
+            written += len(cell)
+            i += 1
+        f.write('Cell["end", "Text"]\n}, WindowSize->{808, 911}]\n')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('notebook', nargs='?')
+    args = parser.parse_args()
+
+    path = args.notebook
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.nb')
+        os.close(fd)
+        generate(path, int(args.size * 1e6))
+
+    try:
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        print('{}: {:.1f} MB'.format(path, len(data) / 1e6))
+
+        start = time.perf_counter()
+        cells = sum(1 for _ in scan_cells(data))
+        print('{:>14}: {:8.2f} s  ({} cells)'.format('scan_cells', time.perf_counter() - start,
+                                                   cells))
+
+        start = time.perf_counter()
+        index_cells(data)
+        print('{:>14}: {:8.2f} s'.format('index_cells', time.perf_counter() - start))
+
+        start = time.perf_counter()
+        count = sum(len(tokens) for _, tokens in lex_notebook(data))
+        print('{:>14}: {:8.2f} s  ({:,} tokens)'.format('lex_notebook', time.perf_counter() - start,
+                                                      count))
+
+        cache_directory = tempfile.mkdtemp()
+        try:
+            cache = DiskCache(cache_directory)
+            formatter = HtmlFormatter()
+            # The same notebook with one input cell changed
+            changed = data[:].replace(b'"Sin"', b'"Cos"', 1)
+            for name, notebook in (('rehighlight', data), ('unchanged', data),
+                                   ('one changed', changed)):
+                start = time.perf_counter()
+                cells = rehighlight_notebook(notebook, formatter, cache, workers=args.workers)
+                print('{:>14}: {:8.2f} s  ({} code cells)'.format(
+                    name, time.perf_counter() - start, len(cells)))
+        finally:
+            shutdown_pool()
+            shutil.rmtree(cache_directory)
+
+        start = time.perf_counter()
+        text = str(data[:], 'utf-8')
+        count = sum(1 for _ in MathematicaLexer().get_tokens_unprocessed(text))
+        print('{:>14}: {:8.2f} s  ({:,} tokens)'.format('whole file', time.perf_counter() - start,
+                                                      count))
+        data.close()
+
+        boxes = 'BoxData[RowBox[{{{}, "0"}}]]'.format(', '.join(
+            'SuperscriptBox["x{0}", FractionBox["1", RowBox[{{"n", "+", "{0}"}}]]], "+"'.format(i)
+            for i in range(100000))).encode('ascii')
+        start = time.perf_counter()
+        code = flatten_boxes(boxes)
+        print('{:>14}: {:8.2f} s  ({:.1f} MB of boxes, {:,} characters of code)'.format(
+            'flatten_boxes', time.perf_counter() - start, len(boxes) / 1e6, len(code.text)))
+    finally:
+        if args.notebook is None:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""Measures the private memory of forked workers that highlight code, depending on how much of the
+work was done in the parent before forking.
+
+Usage: python benchmarks/preload_rss.py [--workers N]
+
+Modes:
+    lazy            the workers import mathematica on their first request
+    import          the parent imports mathematica before forking
+    preload         the parent calls mathematica.preload()
+    preload-freeze  the parent calls mathematica.preload(freeze=True)
+
+Each worker lexes a sample, runs a full garbage collection as a long-running worker eventually
+would, and reports its unique set size (USS, the memory that isn't shared with any other process)
+and its proportional set size (PSS) from /proc/self/smaps_rollup. Linux only.
+"""
+
+import argparse
+import gc
+import os
+import subprocess
+import sys
+
+MODES = ('lazy', 'import', 'preload', 'preload-freeze')
+
+
+def smaps_rollup():
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1])
+    return values
+
+
+def worker(write_fd):
+    from mathematica.lexer import MathematicaLexer
+    from mathematica import PRELOAD_SAMPLE
+
+    text = PRELOAD_SAMPLE * 200
+    list(MathematicaLexer().get_tokens(text))
+    gc.collect()
+    values = smaps_rollup()
+    os.write(write_fd, '{} {}\n'.format(values['Private_Clean'] + values['Private_Dirty'],
+                                        values['Pss']).encode('ascii'))
+
+
+def run(mode, workers):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    if mode != 'lazy':
+        import mathematica
+        if mode.startswith('preload'):
+            mathematica.preload(freeze=mode == 'preload-freeze')
+
+    read_fd, write_fd = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                worker(write_fd)
+                # Stay alive until every worker has measured, so that PSS divides shared pages
+                # among all of them
+                os.read(read_fd, 1)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+
+    results = []
+    with os.fdopen(read_fd, 'rb', buffering=0) as f:
+        while len(results) < workers:
+            results.append([int(value) for value in f.readline().split()])
+        os.write(write_fd, b'x' * workers)
+        for pid in pids:
+            os.waitpid(pid, 0)
+
+    uss = sum(result[0] for result in results) / workers / 1024
+    pss = sum(result[1] for result in results) / workers / 1024
+    print('{:>15}: USS {:6.1f} MB  PSS {:6.1f} MB per worker'.format(mode, uss, pss))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--mode', choices=MODES)
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.workers)
+    else:
+        for mode in MODES:
+            subprocess.check_call([sys.executable, __file__, '--mode', mode,
+                                   '--workers', str(args.workers)])
+
+
+if __name__ == '__main__':
+    main()
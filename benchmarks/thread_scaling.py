@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""Measures the throughput of a single MathematicaLexer shared by a pool of 1 to N threads.
+
+Usage: python benchmarks/thread_scaling.py [--threads N] [--snippets N] [--cache]
+
+Throughput only scales with the number of threads on a free-threaded build of Python (e.g.
+python3.13t) with as many cores; with the GIL it stays flat. With --cache, every snippet is
+looked up in a shared TokenCache, which measures its lookups since all but the first round hit.
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mathematica.cache import TokenCache  # noqa: E402
+from mathematica.lexer import MathematicaLexer  # noqa: E402
+
+SNIPPET = '''f{0}[x_, y_] := Module[{{z = x + {0}}}, z^2 + y]
+Plot[Sin[{0} x], {{x, 0, 2 Pi}}, PlotStyle -> Red]
+data = Table[{{i, RandomReal[]}}, {{i, {0}}}]; ListPlot[data] (* plot {0} *)
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=os.cpu_count())
+    parser.add_argument('--snippets', type=int, default=2000)
+    parser.add_argument('--cache', action='store_true')
+    args = parser.parse_args()
+
+    gil = sys._is_gil_enabled() if hasattr(sys, '_is_gil_enabled') else True
+    print('Python {}, GIL {}, {} CPUs'.format(sys.version.split()[0], 'enabled' if gil else
+                                              'disabled', os.cpu_count()))
+
+    lexer = MathematicaLexer(cache=TokenCache() if args.cache else False)
+    snippets = [SNIPPET.format(i) for i in range(args.snippets)]
+    expected = [list(lexer.get_tokens_unprocessed(code)) for code in snippets]
+
+    def lex(code):
+        return list(lexer.get_tokens_unprocessed(code))
+
+    baseline = None
+    threads = 1
+    while threads <= args.threads:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            start = time.time()
+            results = list(pool.map(lex, snippets))
+            elapsed = time.time() - start
+
+        assert results == expected
+        throughput = len(snippets) / elapsed
+        baseline = baseline or throughput
+        print('{:3} threads: {:8.0f} snippets/s  ({:.2f}x)'.format(threads, throughput,
+                                                                   throughput / baseline))
+        threads *= 2
+
+
+if __name__ == '__main__':
+    main()
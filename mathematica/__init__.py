@@ -2,5 +2,33 @@
 # Copyright (c) 2016 rsmenon
 # Licensed under the MIT License (https://opensource.org/licenses/MIT)
 
+import gc
+
 from mathematica.lexer import MathematicaLexer
 from mathematica.style import MathematicaNotebookStyle, MathematicaStyle
+
+# Exercises every lexer state and annotation once
+PRELOAD_SAMPLE = '''BeginPackage["Sample`"]
+Begin["`Private`"]
+f[x_, y_:1] := Module[{z = x \\[Alpha] \\:03b2}, <|"a" -> #|> & /@ {z, y, 1.5*^3, 16^^ff}]
+f::usage = "f[x] (* is not a comment *)"
+(* a (* nested *) comment *)
+End[]
+EndPackage[]
+'''
+
+
+def preload(freeze=False):
+    """Does the work that is otherwise done on first use of the lexer: compiling the lexing rules
+    and computing the lexer fingerprint. Call it in a pre-forking server before the workers are
+    forked, so that they share the result copy-on-write instead of each building their own copy.
+
+    With freeze=True, the heap is frozen with gc.freeze() afterwards, so that the garbage collector
+    of the workers doesn't write to (and thus copy) the pages of the objects created so far."""
+    lexer = MathematicaLexer()
+    MathematicaLexer.fingerprint()
+    list(lexer.get_tokens(PRELOAD_SAMPLE))
+
+    if freeze:
+        gc.collect()
+        gc.freeze()
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import asyncio
+import time
+from functools import partial
+
+import pygments
+
+from mathematica.lexer import MathematicaLexer
+from mathematica.parallel import worker_lexer
+
+
+async def alex(text, lexer=None, tokens_per_yield=1000, ms_per_yield=5):
+    """An async generator of the tokens of lexer.get_tokens_unprocessed(text), which hands control
+    back to the event loop after every tokens_per_yield tokens, or after ms_per_yield milliseconds
+    of lexing, whichever comes first."""
+    if lexer is None:
+        lexer = MathematicaLexer()
+
+    interval = ms_per_yield / 1000.0
+    deadline = time.monotonic() + interval
+    count = 0
+    for token in lexer.get_tokens_unprocessed(text):
+        yield token
+
+        count += 1
+        # The clock is only read every few tokens, as it costs about as much as lexing a token
+        if count >= tokens_per_yield or (not count & 63 and time.monotonic() >= deadline):
+            await asyncio.sleep(0)
+            deadline = time.monotonic() + interval
+            count = 0
+
+
+def _highlight(formatter, code):
+    return pygments.highlight(code, worker_lexer(), formatter)
+
+
+async def ahighlight(code, formatter, lexer=None, executor=None, threshold=64 * 1024):
+    """Returns pygments.highlight(code, lexer, formatter) without blocking the event loop for long:
+    code of threshold characters or more is highlighted in executor, which may be a thread or a
+    process pool, or the default executor of the loop if None. Since lexing holds the GIL, a
+    process pool keeps the loop the most responsive. The lexer defaults to a MathematicaLexer."""
+    if len(code) < threshold:
+        return pygments.highlight(code, lexer or MathematicaLexer(), formatter)
+
+    if lexer is None:
+        # Processes of a pool create their lexer once, and threads share one
+        func = partial(_highlight, formatter, code)
+    else:
+        func = partial(pygments.highlight, code, lexer, formatter)
+
+    return await asyncio.get_running_loop().run_in_executor(executor, func)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+from array import array
+from collections import namedtuple
+
+from mathematica.lexer import MathematicaLexer, MToken
+from mathematica.serialize import TOKEN_IDS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SYMBOL_TOKENS = frozenset((MToken.BUILTIN, MToken.LOCAL_SCOPE, MToken.PRIVATE, MToken.SYMBOL))
+
+# starts, lengths and types have an entry per token, and types holds the index of each token type
+# in mathematica.lexer.TOKEN_TYPES. symbols holds the index in symbol_names of the value of each
+# symbol token (builtins, local variables, etc.) and -1 for the other tokens.
+TokenArrays = namedtuple('TokenArrays', ['starts', 'lengths', 'types', 'symbols', 'symbol_names'])
+
+
+def lex_to_arrays(text, lexer=None):
+    """Lexes text into a TokenArrays of NumPy arrays for vectorized analysis. Requires the numpy
+    extra (pip install pygments-mathematica[numpy])."""
+    if np is None:
+        raise ImportError('lex_to_arrays requires numpy (pip install pygments-mathematica[numpy])')
+
+    if lexer is None:
+        lexer = MathematicaLexer()
+
+    starts, lengths, symbols = array('q'), array('q'), array('q')
+    types = bytearray()
+    symbol_ids = {}
+    for start, end, token in lexer.get_token_spans(text):
+        starts.append(start)
+        lengths.append(end - start)
+        types.append(TOKEN_IDS[token])
+        if token in SYMBOL_TOKENS:
+            symbols.append(symbol_ids.setdefault(text[start:end], len(symbol_ids)))
+        else:
+            symbols.append(-1)
+
+    return TokenArrays(
+        starts=_to_numpy(starts, np.int64),
+        lengths=_to_numpy(lengths, np.int64),
+        types=_to_numpy(types, np.uint8),
+        symbols=_to_numpy(symbols, np.int64),
+        symbol_names=np.array(list(symbol_ids), dtype=object),
+    )
+
+
+def _to_numpy(values, dtype):
+    # The array shares the buffer of values instead of copying it
+    return np.frombuffer(values, dtype=dtype) if len(values) else np.empty(0, dtype=dtype)
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import argparse
+import fnmatch
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pygments
+from pygments.formatters import get_formatter_by_name
+
+from mathematica import parallel
+from mathematica.lexer import MathematicaLexer
+from mathematica.style import STYLES
+
+FORMATS = {
+    'html': ('html', '.html'),
+    'latex': ('latex', '.tex'),
+    'ansi': ('terminal256', '.ansi'),
+}
+
+MANIFEST = 'mma-highlight.json'
+MANIFEST_VERSION = 1
+
+
+def find_files(paths, patterns=None, threads=8):
+    """Returns (root, path, stat) for each file under paths (files or directories) whose name
+    matches one of patterns, which default to the filenames of the lexer. Directories are listed
+    by a pool of threads, since listing and stat calls spend their time waiting on the disk."""
+    patterns = patterns or MathematicaLexer.filenames
+    found = []
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = set()
+        for root in paths:
+            if os.path.isdir(root):
+                pending.add(pool.submit(_scan, root, root, patterns))
+            else:
+                found.append((os.path.dirname(root), root, os.stat(root)))
+
+        while pending:
+            future = next(as_completed(pending))
+            pending.remove(future)
+            files, directories = future.result()
+            found.extend(files)
+            for root, directory in directories:
+                pending.add(pool.submit(_scan, root, directory, patterns))
+
+    # A file that is under several of paths is only returned once
+    unique = {}
+    for root, path, stat in found:
+        unique.setdefault(os.path.abspath(path), (root, path, stat))
+    return sorted(unique.values(), key=lambda item: item[1])
+
+
+def _scan(root, directory, patterns):
+    files = []
+    directories = []
+    try:
+        entries = list(os.scandir(directory))
+    except OSError:
+        return files, directories
+
+    for entry in entries:
+        if entry.name.startswith('.'):
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                directories.append((root, entry.path))
+            elif any(fnmatch.fnmatch(entry.name, pattern) for pattern in patterns):
+                files.append((root, entry.path, entry.stat()))
+        except OSError:
+            pass
+
+    return files, directories
+
+
+def _highlight_file(formatter, source, output, digest):
+    # Runs in a worker. The file is not highlighted if its content still has the given digest, so
+    # that files that were only touched are skipped without being lexed.
+    with open(source, 'rb') as f:
+        data = f.read()
+    new_digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if new_digest == digest and os.path.exists(output):
+        return 'unchanged', new_digest, len(data)
+
+    try:
+        code = data.decode('utf-8')
+    except UnicodeDecodeError:
+        code = data.decode('latin-1')
+
+    result = pygments.highlight(code, parallel.worker_lexer(), formatter)
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        f.write(result)
+
+    return 'highlighted', new_digest, len(data)
+
+
+def _load_manifest(path, config):
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    # The outputs of a different formatter, style or lexer are all out of date
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('config') != config:
+        return {}
+    return manifest.get('files', {})
+
+
+def _save_manifest(path, config, files):
+    data = json.dumps({'version': MANIFEST_VERSION, 'config': config, 'files': files},
+                      indent=1, sort_keys=True)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def highlight_files(paths, output_dir=None, format='html', style='mathematica', options=None,
+                    workers=None, manifest=None, force=False):
+    """Highlights the Mathematica files under paths into output_dir, or next to each file if
+    output_dir is None, and returns a dict of statistics.
+
+    Files whose modification time and size are those recorded in the manifest are skipped without
+    being read, and files whose content has the recorded hash are skipped without being lexed,
+    unless force is True."""
+    start = time.perf_counter()
+    name, extension = FORMATS[format]
+    formatter_options = dict(options or {})
+    formatter_options['style'] = STYLES.get(style, style)
+    formatter = get_formatter_by_name(name, **formatter_options)
+    config = {
+        'format': format,
+        'style': style,
+        'options': sorted((k, str(v)) for k, v in (options or {}).items()),
+        'lexer': MathematicaLexer.fingerprint(),
+    }
+    manifest = manifest or os.path.join(output_dir or '.', MANIFEST)
+    entries = {} if force else _load_manifest(manifest, config)
+
+    stats = {
+        'files': 0,
+        'highlighted': 0,
+        'unchanged_mtime': 0,
+        'unchanged_hash': 0,
+        'errors': 0,
+        'bytes': 0,
+    }
+    files = {}
+    jobs = []
+    for root, source, stat in find_files(paths):
+        stats['files'] += 1
+        relative = os.path.relpath(source, root)
+        output = (os.path.join(output_dir, relative) if output_dir else source) + extension
+        key = os.path.abspath(source)
+        entry = entries.get(key)
+        if (entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and
+                entry['size'] == stat.st_size and os.path.exists(output)):
+            stats['unchanged_mtime'] += 1
+            files[key] = entry
+        else:
+            jobs.append((stat.st_size, key, source, output, entry and entry['hash'], stat))
+
+    # The largest files are started first, so that no worker is left with a large file at the end
+    jobs.sort(key=lambda job: -job[0])
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) < 2:
+        pool = ThreadPoolExecutor(max_workers=1)
+    else:
+        pool = parallel.get_pool(workers)
+
+    futures = dict((pool.submit(_highlight_file, formatter, source, output, digest),
+                    (key, source, output, stat)) for _, key, source, output, digest, stat in jobs)
+    for future in as_completed(futures):
+        key, source, output, stat = futures[future]
+        try:
+            status, digest, size = future.result()
+        except Exception as e:
+            stats['errors'] += 1
+            print('{}: {}: {}'.format(source, type(e).__name__, e), file=sys.stderr)
+            continue
+
+        if status == 'highlighted':
+            stats['highlighted'] += 1
+            stats['bytes'] += size
+        else:
+            stats['unchanged_hash'] += 1
+        files[key] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest,
+                      'output': os.path.abspath(output)}
+
+    if isinstance(pool, ThreadPoolExecutor):
+        pool.shutdown()
+
+    # Entries of files that weren't under paths this time are kept, unless the files are gone
+    entries = dict((key, entry) for key, entry in entries.items() if os.path.exists(key))
+    entries.update(files)
+    _save_manifest(manifest, config, entries)
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='mma-highlight',
+        description='Highlights Mathematica files ({}) in parallel, skipping files that have not '
+                    'changed since the last run.'.format(', '.join(MathematicaLexer.filenames)))
+    parser.add_argument('paths', nargs='+', help='files or directories to highlight')
+    parser.add_argument('-o', '--output-dir', help='directory to write the highlighted files to '
+                        '(default: next to each file)')
+    parser.add_argument('-f', '--format', choices=sorted(FORMATS), default='html')
+    parser.add_argument('-s', '--style', default='mathematica')
+    parser.add_argument('-O', dest='options', action='append', default=[], metavar='KEY=VALUE',
+                        help='formatter option, e.g. -O full=true')
+    parser.add_argument('-j', '--workers', type=int, help='number of worker processes')
+    parser.add_argument('--manifest', help='path of the manifest (default: {} in the output '
+                        'directory)'.format(MANIFEST))
+    parser.add_argument('--force', action='store_true', help='highlight all files')
+    args = parser.parse_args(argv)
+
+    options = dict(option.partition('=')[::2] for option in args.options)
+    try:
+        stats = highlight_files(args.paths, args.output_dir, args.format, args.style, options,
+                                args.workers, args.manifest, args.force)
+    finally:
+        parallel.shutdown_pool()
+
+    seconds = stats['seconds']
+    print('{files} files: {highlighted} highlighted, {unchanged_mtime} unchanged (mtime), '
+          '{unchanged_hash} unchanged (hash), {errors} errors'.format(**stats))
+    print('{:.1f} s, {:.1f} files/s, {:.2f} MB/s highlighted'.format(
+        seconds, stats['highlighted'] / seconds if seconds else 0,
+        stats['bytes'] / 1e6 / seconds if seconds else 0))
+    checked = stats['files'] or 1
+    print('cache: {:.0%} hits ({:.0%} by mtime, {:.0%} by hash)'.format(
+        (stats['unchanged_mtime'] + stats['unchanged_hash']) / checked,
+        stats['unchanged_mtime'] / checked, stats['unchanged_hash'] / checked))
+    return 1 if stats['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
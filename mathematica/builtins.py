@@ -2,6 +2,8 @@
 # Copyright (c) 2016 rsmenon
 # Licensed under the MIT License (https://opensource.org/licenses/MIT)
 
+from types import MappingProxyType
+
 OPERATORS = (
     u'+',  # Plus
     u'-',  # Minus
@@ -8038,3 +8040,412 @@ UNICODE_SYSTEM_UNDEFINED_SYMBOLS = {
     u'ξ',  # \[Xi]
     u'ζ',  # \[Zeta]
 }
+
+# NAMED_CHARACTERS_START
+# Code points of the named characters (\[Name]) that have a unicode form in the tables above
+NAMED_CHARACTERS = {
+    u'Aleph': u'ℵ',  # U+2135
+    u'Alpha': u'α',  # U+03B1
+    u'And': u'∧',  # U+2227
+    u'Angle': u'∠',  # U+2220
+    u'Angstrom': u'Å',  # U+00C5
+    u'AscendingEllipsis': u'⋰',  # U+22F0
+    u'Backslash': u'∖',  # U+2216
+    u'BeamedEighthNote': u'♫',  # U+266B
+    u'BeamedSixteenthNote': u'♬',  # U+266C
+    u'Because': u'∵',  # U+2235
+    u'Bet': u'ℶ',  # U+2136
+    u'Beta': u'β',  # U+03B2
+    u'Bullet': u'•',  # U+2022
+    u'Cap': u'⌢',  # U+2322
+    u'CapitalAlpha': u'Α',  # U+0391
+    u'CapitalBeta': u'Β',  # U+0392
+    u'CapitalChi': u'Χ',  # U+03A7
+    u'CapitalDelta': u'Δ',  # U+0394
+    u'CapitalDigamma': u'Ϝ',  # U+03DC
+    u'CapitalEpsilon': u'Ε',  # U+0395
+    u'CapitalEta': u'Η',  # U+0397
+    u'CapitalGamma': u'Γ',  # U+0393
+    u'CapitalIota': u'Ι',  # U+0399
+    u'CapitalKappa': u'Κ',  # U+039A
+    u'CapitalKoppa': u'Ϟ',  # U+03DE
+    u'CapitalLambda': u'Λ',  # U+039B
+    u'CapitalMu': u'Μ',  # U+039C
+    u'CapitalNu': u'Ν',  # U+039D
+    u'CapitalOmega': u'Ω',  # U+03A9
+    u'CapitalOmicron': u'Ο',  # U+039F
+    u'CapitalPhi': u'Φ',  # U+03A6
+    u'CapitalPi': u'Π',  # U+03A0
+    u'CapitalPsi': u'Ψ',  # U+03A8
+    u'CapitalRho': u'Ρ',  # U+03A1
+    u'CapitalSampi': u'Ϡ',  # U+03E0
+    u'CapitalSigma': u'Σ',  # U+03A3
+    u'CapitalStigma': u'Ϛ',  # U+03DA
+    u'CapitalTau': u'Τ',  # U+03A4
+    u'CapitalTheta': u'Θ',  # U+0398
+    u'CapitalUpsilon': u'Υ',  # U+03A5
+    u'CapitalXi': u'Ξ',  # U+039E
+    u'CapitalZeta': u'Ζ',  # U+0396
+    u'CenterDot': u'·',  # U+00B7
+    u'CenterEllipsis': u'⋯',  # U+22EF
+    u'Checkmark': u'✓',  # U+2713
+    u'Chi': u'χ',  # U+03C7
+    u'CircleDot': u'⊙',  # U+2299
+    u'CircleMinus': u'⊖',  # U+2296
+    u'CirclePlus': u'⊕',  # U+2295
+    u'CircleTimes': u'⊗',  # U+2297
+    u'ClockwiseContourIntegral': u'∲',  # U+2232
+    u'CloseCurlyDoubleQuote': u'”',  # U+201D
+    u'CloseCurlyQuote': u'’',  # U+2019
+    u'CloverLeaf': u'⌘',  # U+2318
+    u'ClubSuit': u'♣',  # U+2663
+    u'Colon': u'∶',  # U+2236
+    u'Congruent': u'≡',  # U+2261
+    u'ContourIntegral': u'∮',  # U+222E
+    u'Coproduct': u'∐',  # U+2210
+    u'CounterClockwiseContourIntegral': u'∳',  # U+2233
+    u'Cup': u'⌣',  # U+2323
+    u'CupCap': u'≍',  # U+224D
+    u'CurlyCapitalUpsilon': u'ϒ',  # U+03D2
+    u'CurlyEpsilon': u'ε',  # U+03B5
+    u'CurlyKappa': u'ϰ',  # U+03F0
+    u'CurlyPhi': u'φ',  # U+03C6
+    u'CurlyPi': u'ϖ',  # U+03D6
+    u'CurlyRho': u'ϱ',  # U+03F1
+    u'CurlyTheta': u'ϑ',  # U+03D1
+    u'Dagger': u'†',  # U+2020
+    u'Dalet': u'ℸ',  # U+2138
+    u'Dash': u'–',  # U+2013
+    u'Degree': u'°',  # U+00B0
+    u'Del': u'∇',  # U+2207
+    u'Delta': u'δ',  # U+03B4
+    u'DescendingEllipsis': u'⋱',  # U+22F1
+    u'Diameter': u'⌀',  # U+2300
+    u'Diamond': u'⋄',  # U+22C4
+    u'DiamondSuit': u'♢',  # U+2662
+    u'Digamma': u'ϝ',  # U+03DD
+    u'Divide': u'÷',  # U+00F7
+    u'DotEqual': u'≐',  # U+2250
+    u'DoubleContourIntegral': u'∯',  # U+222F
+    u'DoubleDagger': u'‡',  # U+2021
+    u'DoubleDownArrow': u'⇓',  # U+21D3
+    u'DoubleLeftArrow': u'⇐',  # U+21D0
+    u'DoubleLeftRightArrow': u'⇔',  # U+21D4
+    u'DoubleLeftTee': u'⫤',  # U+2AE4
+    u'DoubleLongLeftArrow': u'⟸',  # U+27F8
+    u'DoubleLongLeftRightArrow': u'⟺',  # U+27FA
+    u'DoubleLongRightArrow': u'⟹',  # U+27F9
+    u'DoublePrime': u'″',  # U+2033
+    u'DoubleRightArrow': u'⇒',  # U+21D2
+    u'DoubleRightTee': u'⊨',  # U+22A8
+    u'DoubleUpArrow': u'⇑',  # U+21D1
+    u'DoubleUpDownArrow': u'⇕',  # U+21D5
+    u'DoubleVerticalBar': u'∥',  # U+2225
+    u'DownArrow': u'↓',  # U+2193
+    u'DownArrowBar': u'⤓',  # U+2913
+    u'DownArrowUpArrow': u'⇵',  # U+21F5
+    u'DownLeftRightVector': u'⥐',  # U+2950
+    u'DownLeftTeeVector': u'⥞',  # U+295E
+    u'DownLeftVector': u'↽',  # U+21BD
+    u'DownLeftVectorBar': u'⥖',  # U+2956
+    u'DownPointer': u'▾',  # U+25BE
+    u'DownRightTeeVector': u'⥟',  # U+295F
+    u'DownRightVector': u'⇁',  # U+21C1
+    u'DownRightVectorBar': u'⥗',  # U+2957
+    u'DownTee': u'⊤',  # U+22A4
+    u'DownTeeArrow': u'↧',  # U+21A7
+    u'Earth': u'♁',  # U+2641
+    u'EighthNote': u'♪',  # U+266A
+    u'Element': u'∈',  # U+2208
+    u'Ellipsis': u'…',  # U+2026
+    u'EmptyCircle': u'○',  # U+25CB
+    u'EmptyDiamond': u'◇',  # U+25C7
+    u'EmptyDownTriangle': u'▽',  # U+25BD
+    u'EmptyRectangle': u'▯',  # U+25AF
+    u'EmptySet': u'∅',  # U+2205
+    u'EmptySmallCircle': u'◦',  # U+25E6
+    u'EmptySmallSquare': u'◻',  # U+25FB
+    u'EmptySquare': u'□',  # U+25A1
+    u'EmptyUpTriangle': u'△',  # U+25B3
+    u'EmptyVerySmallSquare': u'▫',  # U+25AB
+    u'Epsilon': u'ϵ',  # U+03F5
+    u'EqualTilde': u'≂',  # U+2242
+    u'Equilibrium': u'⇌',  # U+21CC
+    u'Equivalent': u'⧦',  # U+29E6
+    u'Eta': u'η',  # U+03B7
+    u'Euro': u'€',  # U+20AC
+    u'Exists': u'∃',  # U+2203
+    u'FilledCircle': u'●',  # U+25CF
+    u'FilledDiamond': u'◆',  # U+25C6
+    u'FilledDownTriangle': u'▼',  # U+25BC
+    u'FilledLeftTriangle': u'◀',  # U+25C0
+    u'FilledRectangle': u'▮',  # U+25AE
+    u'FilledRightTriangle': u'▶',  # U+25B6
+    u'FilledSmallSquare': u'◼',  # U+25FC
+    u'FilledSquare': u'■',  # U+25A0
+    u'FilledUpTriangle': u'▲',  # U+25B2
+    u'FilledVerySmallSquare': u'▪',  # U+25AA
+    u'FinalSigma': u'ς',  # U+03C2
+    u'FivePointedStar': u'★',  # U+2605
+    u'Flat': u'♭',  # U+266D
+    u'ForAll': u'∀',  # U+2200
+    u'Gamma': u'γ',  # U+03B3
+    u'Gimel': u'ℷ',  # U+2137
+    u'GothicCapitalC': u'ℭ',  # U+212D
+    u'GothicCapitalH': u'ℌ',  # U+210C
+    u'GothicCapitalI': u'ℑ',  # U+2111
+    u'GothicCapitalR': u'ℜ',  # U+211C
+    u'GothicCapitalZ': u'ℨ',  # U+2128
+    u'GreaterEqual': u'≥',  # U+2265
+    u'GreaterEqualLess': u'⋛',  # U+22DB
+    u'GreaterFullEqual': u'≧',  # U+2267
+    u'GreaterGreater': u'≫',  # U+226B
+    u'GreaterLess': u'≷',  # U+2277
+    u'GreaterSlantEqual': u'⩾',  # U+2A7E
+    u'GreaterTilde': u'≳',  # U+2273
+    u'HBar': u'ℏ',  # U+210F
+    u'HappySmiley': u'☺',  # U+263A
+    u'HeartSuit': u'♡',  # U+2661
+    u'HorizontalLine': u'─',  # U+2500
+    u'HumpDownHump': u'≎',  # U+224E
+    u'HumpEqual': u'≏',  # U+224F
+    u'Hyphen': u'‐',  # U+2010
+    u'Infinity': u'∞',  # U+221E
+    u'Integral': u'∫',  # U+222B
+    u'Intersection': u'⋂',  # U+22C2
+    u'Iota': u'ι',  # U+03B9
+    u'Jupiter': u'♃',  # U+2643
+    u'Kappa': u'κ',  # U+03BA
+    u'Koppa': u'ϟ',  # U+03DF
+    u'Lambda': u'λ',  # U+03BB
+    u'LeftAngleBracket': u'〈',  # U+3008
+    u'LeftArrow': u'←',  # U+2190
+    u'LeftArrowBar': u'⇤',  # U+21E4
+    u'LeftArrowRightArrow': u'⇆',  # U+21C6
+    u'LeftCeiling': u'⌈',  # U+2308
+    u'LeftDoubleBracket': u'〚',  # U+301A
+    u'LeftDownTeeVector': u'⥡',  # U+2961
+    u'LeftDownVector': u'⇃',  # U+21C3
+    u'LeftDownVectorBar': u'⥙',  # U+2959
+    u'LeftFloor': u'⌊',  # U+230A
+    u'LeftPointer': u'◂',  # U+25C2
+    u'LeftRightArrow': u'↔',  # U+2194
+    u'LeftRightVector': u'⥎',  # U+294E
+    u'LeftTee': u'⊣',  # U+22A3
+    u'LeftTeeArrow': u'↤',  # U+21A4
+    u'LeftTeeVector': u'⥚',  # U+295A
+    u'LeftTriangle': u'⊲',  # U+22B2
+    u'LeftTriangleBar': u'⧏',  # U+29CF
+    u'LeftTriangleEqual': u'⊴',  # U+22B4
+    u'LeftUpDownVector': u'⥑',  # U+2951
+    u'LeftUpTeeVector': u'⥠',  # U+2960
+    u'LeftUpVector': u'↿',  # U+21BF
+    u'LeftUpVectorBar': u'⥘',  # U+2958
+    u'LeftVector': u'↼',  # U+21BC
+    u'LeftVectorBar': u'⥒',  # U+2952
+    u'LessEqual': u'≤',  # U+2264
+    u'LessEqualGreater': u'⋚',  # U+22DA
+    u'LessFullEqual': u'≦',  # U+2266
+    u'LessGreater': u'≶',  # U+2276
+    u'LessLess': u'≪',  # U+226A
+    u'LessSlantEqual': u'⩽',  # U+2A7D
+    u'LessTilde': u'≲',  # U+2272
+    u'LongDash': u'—',  # U+2014
+    u'LongLeftArrow': u'⟵',  # U+27F5
+    u'LongLeftRightArrow': u'⟷',  # U+27F7
+    u'LongRightArrow': u'⟶',  # U+27F6
+    u'LowerLeftArrow': u'↙',  # U+2199
+    u'LowerRightArrow': u'↘',  # U+2198
+    u'Mars': u'♂',  # U+2642
+    u'MeasuredAngle': u'∡',  # U+2221
+    u'Mercury': u'☿',  # U+263F
+    u'Mho': u'℧',  # U+2127
+    u'Micro': u'µ',  # U+00B5
+    u'MinusPlus': u'∓',  # U+2213
+    u'Mu': u'μ',  # U+03BC
+    u'Nand': u'⊼',  # U+22BC
+    u'Natural': u'♮',  # U+266E
+    u'Neptune': u'♆',  # U+2646
+    u'NestedGreaterGreater': u'⪢',  # U+2AA2
+    u'NestedLessLess': u'⪡',  # U+2AA1
+    u'Nor': u'⊽',  # U+22BD
+    u'Not': u'¬',  # U+00AC
+    u'NotCongruent': u'≢',  # U+2262
+    u'NotCupCap': u'≭',  # U+226D
+    u'NotDoubleVerticalBar': u'∦',  # U+2226
+    u'NotElement': u'∉',  # U+2209
+    u'NotEqual': u'≠',  # U+2260
+    u'NotExists': u'∄',  # U+2204
+    u'NotGreater': u'≯',  # U+226F
+    u'NotGreaterEqual': u'≱',  # U+2271
+    u'NotGreaterFullEqual': u'≩',  # U+2269
+    u'NotGreaterLess': u'≹',  # U+2279
+    u'NotGreaterTilde': u'≵',  # U+2275
+    u'NotLeftTriangle': u'⋪',  # U+22EA
+    u'NotLeftTriangleEqual': u'⋬',  # U+22EC
+    u'NotLess': u'≮',  # U+226E
+    u'NotLessEqual': u'≰',  # U+2270
+    u'NotLessFullEqual': u'≨',  # U+2268
+    u'NotLessGreater': u'≸',  # U+2278
+    u'NotLessTilde': u'≴',  # U+2274
+    u'NotPrecedes': u'⊀',  # U+2280
+    u'NotPrecedesSlantEqual': u'⋠',  # U+22E0
+    u'NotPrecedesTilde': u'⋨',  # U+22E8
+    u'NotReverseElement': u'∌',  # U+220C
+    u'NotRightTriangle': u'⋫',  # U+22EB
+    u'NotRightTriangleEqual': u'⋭',  # U+22ED
+    u'NotSquareSubsetEqual': u'⋢',  # U+22E2
+    u'NotSquareSupersetEqual': u'⋣',  # U+22E3
+    u'NotSubset': u'⊄',  # U+2284
+    u'NotSubsetEqual': u'⊈',  # U+2288
+    u'NotSucceeds': u'⊁',  # U+2281
+    u'NotSucceedsSlantEqual': u'⋡',  # U+22E1
+    u'NotSucceedsTilde': u'⋩',  # U+22E9
+    u'NotSuperset': u'⊅',  # U+2285
+    u'NotSupersetEqual': u'⊉',  # U+2289
+    u'NotTilde': u'≁',  # U+2241
+    u'NotTildeEqual': u'≄',  # U+2244
+    u'NotTildeFullEqual': u'≇',  # U+2247
+    u'NotTildeTilde': u'≉',  # U+2249
+    u'Nu': u'ν',  # U+03BD
+    u'Omega': u'ω',  # U+03C9
+    u'Omicron': u'ο',  # U+03BF
+    u'OpenCurlyDoubleQuote': u'“',  # U+201C
+    u'OpenCurlyQuote': u'‘',  # U+2018
+    u'Or': u'∨',  # U+2228
+    u'OverBracket': u'⎴',  # U+23B4
+    u'Paragraph': u'¶',  # U+00B6
+    u'PartialD': u'∂',  # U+2202
+    u'Phi': u'ϕ',  # U+03D5
+    u'Pi': u'π',  # U+03C0
+    u'PlusMinus': u'±',  # U+00B1
+    u'Pluto': u'♇',  # U+2647
+    u'Precedes': u'≺',  # U+227A
+    u'PrecedesEqual': u'⪯',  # U+2AAF
+    u'PrecedesSlantEqual': u'≼',  # U+227C
+    u'PrecedesTilde': u'≾',  # U+227E
+    u'Prime': u'′',  # U+2032
+    u'Product': u'∏',  # U+220F
+    u'Proportion': u'∷',  # U+2237
+    u'Proportional': u'∝',  # U+221D
+    u'Psi': u'ψ',  # U+03C8
+    u'QuarterNote': u'♩',  # U+2669
+    u'ReturnIndicator': u'↵',  # U+21B5
+    u'ReverseDoublePrime': u'‶',  # U+2036
+    u'ReverseElement': u'∋',  # U+220B
+    u'ReverseEquilibrium': u'⇋',  # U+21CB
+    u'ReversePrime': u'‵',  # U+2035
+    u'ReverseUpEquilibrium': u'⥯',  # U+296F
+    u'Rho': u'ρ',  # U+03C1
+    u'RightAngle': u'∟',  # U+221F
+    u'RightAngleBracket': u'〉',  # U+3009
+    u'RightArrow': u'→',  # U+2192
+    u'RightArrowBar': u'⇥',  # U+21E5
+    u'RightArrowLeftArrow': u'⇄',  # U+21C4
+    u'RightCeiling': u'⌉',  # U+2309
+    u'RightDoubleBracket': u'〛',  # U+301B
+    u'RightDownTeeVector': u'⥝',  # U+295D
+    u'RightDownVector': u'⇂',  # U+21C2
+    u'RightDownVectorBar': u'⥕',  # U+2955
+    u'RightFloor': u'⌋',  # U+230B
+    u'RightPointer': u'▸',  # U+25B8
+    u'RightTee': u'⊢',  # U+22A2
+    u'RightTeeArrow': u'↦',  # U+21A6
+    u'RightTeeVector': u'⥛',  # U+295B
+    u'RightTriangle': u'⊳',  # U+22B3
+    u'RightTriangleBar': u'⧐',  # U+29D0
+    u'RightTriangleEqual': u'⊵',  # U+22B5
+    u'RightUpDownVector': u'⥏',  # U+294F
+    u'RightUpTeeVector': u'⥜',  # U+295C
+    u'RightUpVector': u'↾',  # U+21BE
+    u'RightUpVectorBar': u'⥔',  # U+2954
+    u'RightVector': u'⇀',  # U+21C0
+    u'RightVectorBar': u'⥓',  # U+2953
+    u'RoundImplies': u'⥰',  # U+2970
+    u'SadSmiley': u'☹',  # U+2639
+    u'Sampi': u'ϡ',  # U+03E1
+    u'Saturn': u'♄',  # U+2644
+    u'ScriptCapitalB': u'ℬ',  # U+212C
+    u'ScriptCapitalE': u'ℰ',  # U+2130
+    u'ScriptCapitalF': u'ℱ',  # U+2131
+    u'ScriptCapitalH': u'ℋ',  # U+210B
+    u'ScriptCapitalI': u'ℐ',  # U+2110
+    u'ScriptCapitalL': u'ℒ',  # U+2112
+    u'ScriptCapitalM': u'ℳ',  # U+2133
+    u'ScriptCapitalR': u'ℛ',  # U+211B
+    u'ScriptE': u'ℯ',  # U+212F
+    u'ScriptG': u'ℊ',  # U+210A
+    u'ScriptL': u'ℓ',  # U+2113
+    u'ScriptO': u'ℴ',  # U+2134
+    u'Sharp': u'♯',  # U+266F
+    u'Sigma': u'σ',  # U+03C3
+    u'SixPointedStar': u'✶',  # U+2736
+    u'SkeletonIndicator': u'⁃',  # U+2043
+    u'SmallCircle': u'∘',  # U+2218
+    u'SpaceIndicator': u'␣',  # U+2423
+    u'SpadeSuit': u'♠',  # U+2660
+    u'SphericalAngle': u'∢',  # U+2222
+    u'Sqrt': u'√',  # U+221A
+    u'SquareIntersection': u'⊓',  # U+2293
+    u'SquareSubset': u'⊏',  # U+228F
+    u'SquareSubsetEqual': u'⊑',  # U+2291
+    u'SquareSuperset': u'⊐',  # U+2290
+    u'SquareSupersetEqual': u'⊒',  # U+2292
+    u'SquareUnion': u'⊔',  # U+2294
+    u'Star': u'⋆',  # U+22C6
+    u'Stigma': u'ϛ',  # U+03DB
+    u'Subset': u'⊂',  # U+2282
+    u'SubsetEqual': u'⊆',  # U+2286
+    u'Succeeds': u'≻',  # U+227B
+    u'SucceedsEqual': u'⪰',  # U+2AB0
+    u'SucceedsSlantEqual': u'≽',  # U+227D
+    u'SucceedsTilde': u'≿',  # U+227F
+    u'SuchThat': u'∍',  # U+220D
+    u'Sum': u'∑',  # U+2211
+    u'Superset': u'⊃',  # U+2283
+    u'SupersetEqual': u'⊇',  # U+2287
+    u'Tau': u'τ',  # U+03C4
+    u'Therefore': u'∴',  # U+2234
+    u'Theta': u'θ',  # U+03B8
+    u'Tilde': u'∼',  # U+223C
+    u'TildeEqual': u'≃',  # U+2243
+    u'TildeFullEqual': u'≅',  # U+2245
+    u'TildeTilde': u'≈',  # U+2248
+    u'Times': u'×',  # U+00D7
+    u'Trademark': u'™',  # U+2122
+    u'UnderBracket': u'⎵',  # U+23B5
+    u'Union': u'⋃',  # U+22C3
+    u'UnionPlus': u'⊎',  # U+228E
+    u'UpArrow': u'↑',  # U+2191
+    u'UpArrowBar': u'⤒',  # U+2912
+    u'UpArrowDownArrow': u'⇅',  # U+21C5
+    u'UpDownArrow': u'↕',  # U+2195
+    u'UpEquilibrium': u'⥮',  # U+296E
+    u'UpPointer': u'▴',  # U+25B4
+    u'UpTee': u'⊥',  # U+22A5
+    u'UpTeeArrow': u'↥',  # U+21A5
+    u'UpperLeftArrow': u'↖',  # U+2196
+    u'UpperRightArrow': u'↗',  # U+2197
+    u'Upsilon': u'υ',  # U+03C5
+    u'Uranus': u'♅',  # U+2645
+    u'Vee': u'⋁',  # U+22C1
+    u'Venus': u'♀',  # U+2640
+    u'VerticalEllipsis': u'⋮',  # U+22EE
+    u'VerticalLine': u'│',  # U+2502
+    u'VerticalTilde': u'≀',  # U+2240
+    u'Wedge': u'⋀',  # U+22C0
+    u'WeierstrassP': u'℘',  # U+2118
+    u'Xi': u'ξ',  # U+03BE
+    u'Xor': u'⊻',  # U+22BB
+    u'Zeta': u'ζ',  # U+03B6
+}
+# NAMED_CHARACTERS_END
+
+# The tables are shared by all lexers, including lexers that are used from several threads at once,
+# so they are made immutable
+SYSTEM_SYMBOLS = frozenset(SYSTEM_SYMBOLS)
+UNICODE_OPERATORS = frozenset(UNICODE_OPERATORS)
+UNICODE_GROUPINGS = frozenset(UNICODE_GROUPINGS)
+UNICODE_SYSTEM_SYMBOLS = frozenset(UNICODE_SYSTEM_SYMBOLS)
+UNICODE_SYSTEM_UNDEFINED_SYMBOLS = frozenset(UNICODE_SYSTEM_UNDEFINED_SYMBOLS)
+NAMED_CHARACTERS = MappingProxyType(NAMED_CHARACTERS)
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+
+import pygments
+
+from mathematica import serialize
+from mathematica.lexer import RUNTIME_OPTIONS, MathematicaLexer
+
+
+class TokenCache:
+    """An LRU cache of lexed token streams that holds at most max_bytes of token data.
+
+    It can be used by several threads at once. Lookups don't take the lock that serializes the
+    writes, so the statistics are approximate when threads run in parallel."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Entries are kept in the order in which they were last used, oldest first. A dict is used
+        # rather than an OrderedDict since getting an item of a dict is atomic without the GIL.
+        self._entries = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text, stack, options):
+        digest = hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16)
+        digest.update(repr((tuple(stack), MathematicaLexer.fingerprint())).encode('utf-8'))
+        digest.update(repr(sorted((k, repr(v)) for k, v in options.items()
+                                    if k not in RUNTIME_OPTIONS))
+                      .encode('utf-8'))
+        return digest.digest()
+
+    def lookup(self, key, text):
+        # Entries are never modified once stored, so they are read without the lock
+        entry = self._entries.get(key)
+        # The text is compared as well so that a hash collision can never return wrong tokens
+        if entry is None or entry[0] != text:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        # Marking the entry as recently used is skipped if another thread holds the lock
+        if self._lock.acquire(False):
+            try:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    self._entries[key] = entry
+            finally:
+                self._lock.release()
+
+        return serialize.loads(entry[1], text)
+
+    def store(self, key, text, tokens):
+        # Token values are slices of the text, so the tokens are stored in the compact serialized
+        # form alongside a reference to the text.
+        data = serialize.dumps(tokens)
+        size = sys.getsizeof(text) + sys.getsizeof(data)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[-1]
+
+            self._entries[key] = (text, data, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._bytes -= self._entries.pop(next(iter(self._entries)))[-1]
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+DEFAULT_TOKEN_CACHE = TokenCache()
+
+
+class DiskCache:
+    """A persistent content addressed cache of highlighted output, stored as one file per entry
+    under directory and holding at most max_bytes. It can be shared by several processes."""
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # _bytes is this process's estimate of the size of the cache, which is recomputed from the
+        # directory before evicting since other processes may write to it as well.
+        self._bytes = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(code, formatter, lexer=None):
+        style = formatter.style
+        digest = hashlib.sha256(code.encode('utf-8', 'surrogatepass'))
+        for part in (
+                MathematicaLexer.fingerprint(),
+                type(formatter).__module__ + '.' + type(formatter).__name__,
+                sorted((k, repr(v)) for k, v in formatter.options.items()),
+                style.__module__ + '.' + style.__name__,
+                sorted((repr(k), v) for k, v in style.styles.items()),
+                sorted((k, repr(v)) for k, v in lexer.options.items()
+                       if k not in RUNTIME_OPTIONS)
+                if lexer is not None else None):
+            digest.update(repr(part).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key[2:])
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # The modification time records the last use of an entry for eviction
+            os.utime(path)
+        except OSError:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return data[1:].decode('utf-8') if data[:1] == b's' else data[1:]
+
+    def set(self, key, value):
+        data = b's' + value.encode('utf-8') if isinstance(value, str) else b'b' + value
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write to a temporary file in the same directory and rename it over the entry, so that
+        # readers never see a partially written entry.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._size()
+            else:
+                self._bytes += len(data)
+
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.startswith('.tmp-'):
+                    path = os.path.join(root, name)
+                    try:
+                        yield path, os.stat(path)
+                    except OSError:
+                        pass
+
+    def _size(self):
+        return sum(stat.st_size for _, stat in self._entries())
+
+    def _evict(self):
+        # Remove the least recently used entries until the cache is at 90% of its capacity, which
+        # leaves headroom so that the following writes don't each trigger an eviction.
+        entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+        self._bytes = sum(stat.st_size for _, stat in entries)
+        for path, stat in entries:
+            if self._bytes <= 0.9 * self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self._bytes -= stat.st_size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for path, _ in self._entries():
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            if self._bytes is None:
+                self._bytes = self._size()
+
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+
+def highlight(code, formatter, outfile=None, cache=None, lexer=None):
+    """Like pygments.highlight with a MathematicaLexer, but looks up the result in cache (e.g. a
+    DiskCache) first."""
+    if lexer is None:
+        lexer = MathematicaLexer()
+
+    if cache is None:
+        return pygments.highlight(code, lexer, formatter, outfile)
+
+    key = cache.key(code, formatter, lexer)
+    result = cache.get(key)
+    if result is None:
+        degraded = []
+        if lexer.deadline_ms or lexer.max_tokens or lexer.cancel is not None:
+            # A lexer that records whether it degraded to Text, whose output isn't stored
+            def on_degrade(index, reason, callback=lexer.on_degrade):
+                degraded.append(reason)
+                if callback is not None:
+                    callback(index, reason)
+
+            lexer = type(lexer)(**dict(lexer.options, on_degrade=on_degrade))
+
+        result = pygments.highlight(code, lexer, formatter)
+        if not degraded:
+            cache.set(key, result)
+
+    if outfile is None:
+        return result
+
+    outfile.write(result)
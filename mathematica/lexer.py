@@ -2,18 +2,34 @@
 # Copyright (c) 2016 rsmenon
 # Licensed under the MIT License (https://opensource.org/licenses/MIT)
 
+import hashlib
+import sys
+import threading
+import time
 from collections import defaultdict
+from collections.abc import Mapping
 
-from pygments.lexer import RegexLexer, include, words, bygroups
-from pygments.token import Token as PToken
+from pygments.lexer import RegexLexer, RegexLexerMeta, include, words, bygroups
+from pygments.token import Token as PToken, _TokenType
+from pygments.util import get_bool_opt, get_int_opt
 
 import mathematica.builtins as mma
 
 
+OPEN_GROUPINGS = frozenset(('(', '[', '{', '<|', u'〈', u'〚', r'\[LeftAngleBracket]',
+                            r'\[LeftDoubleBracket]'))
+CLOSE_GROUPINGS = frozenset((')', ']', '}', '|>', u'〉', u'〛', r'\[RightAngleBracket]',
+                             r'\[RightDoubleBracket]'))
+CONTEXT_FUNCTIONS = frozenset(('Begin', 'BeginPackage', 'End', 'EndPackage'))
+POSTFIX_OPERATORS = frozenset(('&', '!', '!!', "'", '++', '--', '..', '...'))
+
+
 class Regex:
     UNICODE = mma.UNICODE_SYSTEM_UNDEFINED_SYMBOLS.union(mma.UNICODE_SYSTEM_SYMBOLS)
-    IDENTIFIER = r'[a-zA-ZΑ-Ωα-ω\${unicode}][a-zA-ZΑ-Ωα-ω0-9\${unicode}]*'.format(unicode=''.join(UNICODE))
+    IDENTIFIER = (r'[a-zA-ZΑ-Ωα-ω\${unicode}][a-zA-ZΑ-Ωα-ω0-9\${unicode}]*'
+                  .format(unicode=''.join(sorted(UNICODE))))
     NAMED_CHARACTER = r'\\\[{identifier}]'.format(identifier=IDENTIFIER)
+    CHARACTER_CODE = r'\\(:[0-9a-fA-F]{4}|\.[0-9a-fA-F]{2}|\|[0-9a-fA-F]{6})'
     SYMBOLS = (r'[`]?({identifier}|{named_character})(`({identifier}|{named_character}))*[`]?'
                .format(identifier=IDENTIFIER, named_character=NAMED_CHARACTER))
     INTEGER = r'[0-9]+'
@@ -37,14 +53,79 @@ class MToken:
     NUMBER = PToken.Number
     OPERATOR = PToken.Operator
     PATTERN = PToken.Name.Tag
+    PRIVATE = PToken.Name.Variable.Private
     SLOT = PToken.Name.Function
     STRING = PToken.String
     SYMBOL = PToken.Name.Variable
+    TEXT = PToken.Text
     UNKNOWN = PToken.Error
     WHITESPACE = PToken.Text.Whitespace
 
 
-class MathematicaLexer(RegexLexer):
+# All token types emitted by the lexer in a stable order, so that a token type can be stored as its
+# index in this tuple
+TOKEN_TYPES = tuple(sorted(set(value for value in vars(MToken).values()
+                               if isinstance(value, _TokenType)), key=str))
+
+# The operators that continue a number after any amount of whitespace (BASE_NUMBER and
+# SCIENTIFIC_NUMBER, as in 16 ^^ ff and 1.5 *^ 3), so that text can't be split before them
+NUMBER_TAILS = ('^^', '*^')
+
+
+def _character_token(char):
+    if char in mma.UNICODE_SYSTEM_SYMBOLS:
+        return MToken.BUILTIN
+    elif char in mma.UNICODE_GROUPINGS:
+        return MToken.GROUP
+    elif char in mma.UNICODE_OPERATORS:
+        return MToken.OPERATOR
+    elif char in mma.UNICODE_SYSTEM_UNDEFINED_SYMBOLS:
+        return MToken.SYMBOL
+    else:
+        return MToken.UNKNOWN
+
+
+def _escaped_characters():
+    # Maps every escaped form of a named character (\[Name], \:xxxx, \.xx and \|xxxxxx with
+    # lowercase hex digits) to the token of its unicode form.
+    table = {}
+    for name, char in mma.NAMED_CHARACTERS.items():
+        token = _character_token(char)
+        code = ord(char)
+        table[u'\\[{}]'.format(name)] = token
+        table[u'\\|{:06x}'.format(code)] = token
+        if code <= 0xffff:
+            table[u'\\:{:04x}'.format(code)] = token
+        if code <= 0xff:
+            table[u'\\.{:02x}'.format(code)] = token
+
+    return table
+
+
+def _decode_character(value):
+    # Codes such as \|ffffff are beyond the last code point, and decode to no character
+    code = int(value[2:], 16)
+    return chr(code) if code <= sys.maxunicode else ''
+
+
+ESCAPED_CHARACTERS = _escaped_characters()
+
+
+class _LexerMeta(RegexLexerMeta):
+    # RegexLexerMeta compiles the rules of a lexer class on its first instantiation, using class
+    # attributes as scratch space, so the first instantiations are serialized in case several
+    # threads create a lexer at the same time. Once _tokens is set, no lock is taken.
+    _lock = threading.RLock()
+
+    def __call__(cls, *args, **kwds):
+        if '_tokens' not in cls.__dict__:
+            with _LexerMeta._lock:
+                return RegexLexerMeta.__call__(cls, *args, **kwds)
+
+        return RegexLexerMeta.__call__(cls, *args, **kwds)
+
+
+class MathematicaLexer(RegexLexer, metaclass=_LexerMeta):
     name = 'Mathematica'
     aliases = ['mathematica', 'mma', 'nb', 'wl', 'wolfram', 'wolfram-language']
     filenames = ['*.cdf', '*.m', '*.ma', '*.nb', '*.wl']
@@ -65,6 +146,7 @@ class MathematicaLexer(RegexLexer):
             (Regex.GROUPINGS, MToken.GROUP),
             (Regex.MESSAGES, bygroups(MToken.OPERATOR, MToken.WHITESPACE, MToken.MESSAGE)),
             (Regex.OPERATORS, MToken.OPERATOR),
+            (Regex.CHARACTER_CODE, MToken.UNKNOWN),
             (Regex.SYMBOLS, MToken.SYMBOL),
             (r'\s+', MToken.WHITESPACE),
         ],
@@ -87,16 +169,226 @@ class MathematicaLexer(RegexLexer):
         ],
     }
 
+    # Computed on the first call to fingerprint(). Threads that call it at the same time may each
+    # compute it, which is harmless as the result is the same.
+    _fingerprint = None
+
+    def __init__(self, **options):
+        RegexLexer.__init__(self, **options)
+        # cache is either a bool or a TokenCache instance (see mathematica.cache). When True, a
+        # cache that is shared with all other lexers in the process is used.
+        self.cache = options.get('cache', False)
+        if isinstance(self.cache, str):
+            self.cache = get_bool_opt(options, 'cache', False)
+
+        if self.cache is True:
+            from mathematica.cache import DEFAULT_TOKEN_CACHE
+            self.cache = DEFAULT_TOKEN_CACHE
+
+        # When intern is True, the values of symbols, operators, groupings and whitespace are
+        # replaced by a single shared string per distinct value, which saves memory when holding on
+        # to large token lists. Builtins map to the strings in mma.SYSTEM_SYMBOLS and at most
+        # intern_size other values are kept in the table of this lexer. The table is only accessed
+        # with single dict operations, so it can be shared by threads using the same lexer.
+        self.intern = get_bool_opt(options, 'intern', False)
+        self.intern_size = get_int_opt(options, 'intern_size', 65536)
+        self._interned = {}
+
+        # deadline_ms and max_tokens bound the time taken and the number of tokens returned by each
+        # call to get_tokens_unprocessed, and cancel is an object with an is_set method (e.g. a
+        # threading.Event) that another thread can set to stop lexing. When any of them is
+        # exceeded, the rest of the text is returned as a single Text token, which the lexer emits
+        # in no other case, and on_degrade(index, reason) is called with the offset of that token
+        # and 'deadline', 'max_tokens' or 'cancelled'.
+        self.deadline_ms = float(options.get('deadline_ms') or 0)
+        self.max_tokens = get_int_opt(options, 'max_tokens', 0)
+        self.cancel = options.get('cancel')
+        self.on_degrade = options.get('on_degrade')
+
+    @classmethod
+    def fingerprint(cls):
+        """A hex digest that changes whenever the output of the lexer may change, i.e. when the lexing
+        rules, the builtins tables or the annotations change."""
+        if cls._fingerprint is None:
+            if '_tokens' not in cls.__dict__:
+                # Instantiating the lexer compiles the rules in tokens into _tokens
+                cls()
+
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(repr(MathematicaAnnotations.version).encode('utf-8'))
+            for state in sorted(cls._tokens):
+                for match, action, new_state in cls._tokens[state]:
+                    if not isinstance(action, _TokenType):
+                        # Callbacks such as bygroups keep their token types in their closure
+                        action = [cell.cell_contents for cell in action.__closure__ or ()]
+                    digest.update(repr((state, match.__self__.pattern, match.__self__.flags, action,
+                                        new_state)).encode('utf-8'))
+
+            for name in sorted(vars(mma)):
+                table = getattr(mma, name)
+                if name.isupper() and isinstance(table, (tuple, set, frozenset, Mapping)):
+                    items = table.items() if isinstance(table, Mapping) else table
+                    digest.update(repr((name, sorted(items))).encode('utf-8'))
+
+            cls._fingerprint = digest.hexdigest()
+
+        return cls._fingerprint
+
     def get_tokens_unprocessed(self, text, stack=('root', )):
+        limited = self.deadline_ms or self.max_tokens or self.cancel is not None
+        if not self.cache:
+            tokens = self._get_annotated_tokens(text, stack)
+            if limited:
+                tokens = self._limit_tokens(tokens, text)
+        else:
+            key = self.cache.key(text, stack, self.options)
+            tokens = self.cache.lookup(key, text)
+            if tokens is None:
+                tokens = self._get_annotated_tokens(text, stack)
+                tokens = list(self._limit_tokens(tokens, text) if limited else tokens)
+                # Degraded tokens aren't stored, since the next call may have time to lex the text
+                if not tokens or tokens[-1][1] is not MToken.TEXT:
+                    self.cache.store(key, text, tokens)
+
+        return self._intern_values(tokens) if self.intern else iter(tokens)
+
+    def _limit_tokens(self, tokens, text):
+        deadline = time.monotonic() + self.deadline_ms / 1000.0 if self.deadline_ms else None
+        count = 0
+        for index, token, value in tokens:
+            count += 1
+            reason = None
+            if self.max_tokens and count > self.max_tokens:
+                reason = 'max_tokens'
+            elif count & 63 == 1:
+                # The clock and the cancel event are only checked every few tokens, as checking
+                # them costs about as much as lexing a token
+                if self.cancel is not None and self.cancel.is_set():
+                    reason = 'cancelled'
+                elif deadline is not None and time.monotonic() >= deadline:
+                    reason = 'deadline'
+
+            if reason is not None:
+                if self.on_degrade is not None:
+                    self.on_degrade(index, reason)
+                yield index, MToken.TEXT, text[index:]
+                return
+
+            yield index, token, value
+
+    def _intern_values(self, tokens):
+        interned = self._interned
+        for index, token, value in tokens:
+            if token in INTERNED_TOKENS:
+                shared = BUILTIN_VALUES.get(value) or interned.get(value)
+                if shared is not None:
+                    value = shared
+                elif len(interned) < self.intern_size:
+                    interned[value] = value
+
+            yield index, token, value
+
+    def get_token_spans(self, text, stack=('root', )):
+        """Yields (start, end, token type) for each token in text. Unlike get_tokens, the text is not
+        preprocessed, and the values of the tokens are only sliced from the text when they are
+        needed to classify a token (e.g. to look up symbols)."""
         ma = MathematicaAnnotations()
-        annotations = (ma.builtins, ma.unicode, ma.lexical_scope)
-        for index, token, value in RegexLexer.get_tokens_unprocessed(self, text):
-            result = (index, token, value)
+        annotations = ma.annotations()
+        for start, end, token in self._get_spans(text, stack):
+            if token in VALUE_TOKENS or (token is MToken.STRING and ma.context.function):
+                value = text[start:end]
+            elif token is MToken.WHITESPACE:
+                # The annotations only need to know whether whitespace contains a newline
+                value = '\n' if text.find('\n', start, end) >= 0 else ' '
+            else:
+                value = None
+
+            result = (start, token, value)
+            for func in annotations:
+                result = func(*result)
+
+            yield start, end, result[1]
+
+    def _get_annotated_tokens(self, text, stack):
+        annotations = MathematicaAnnotations().annotations()
+        for start, end, token in self._get_spans(text, stack):
+            result = (start, token, text[start:end])
             for func in annotations:
                 result = func(*result)
 
             yield result
 
+    def _get_spans(self, text, stack, statestack=None, tokendefs=None):
+        # This is RegexLexer.get_tokens_unprocessed, except that it yields the span of each token
+        # instead of its value. If statestack is a list, it holds the state stack of the lexer as
+        # it progresses, so that it is left with the state at the end of text. text may be bytes
+        # if tokendefs holds rules compiled from bytes patterns.
+        pos = 0
+        if tokendefs is None:
+            tokendefs = self._tokens
+        if statestack is None:
+            statestack = []
+        statestack[:] = stack
+        statetokens = tokendefs[statestack[-1]]
+        while True:
+            for rexmatch, action, new_state in statetokens:
+                m = rexmatch(text, pos)
+                if m:
+                    if type(action) is _TokenType:
+                        yield pos, m.end(), action
+                    elif action is not None:
+                        for index, token, value in action(self, m):
+                            yield index, index + len(value), token
+
+                    pos = m.end()
+                    if new_state is not None:
+                        if isinstance(new_state, tuple):
+                            for state in new_state:
+                                if state == '#pop':
+                                    if len(statestack) > 1:
+                                        statestack.pop()
+                                elif state == '#push':
+                                    statestack.append(statestack[-1])
+                                else:
+                                    statestack.append(state)
+                        elif isinstance(new_state, int):
+                            # Pop, but keep at least one state on the stack
+                            if abs(new_state) >= len(statestack):
+                                del statestack[1:]
+                            else:
+                                del statestack[new_state:]
+                        elif new_state == '#push':
+                            statestack.append(statestack[-1])
+                        statetokens = tokendefs[statestack[-1]]
+                    break
+            else:
+                # None of the rules of the current state matched
+                if pos >= len(text):
+                    break
+                elif text[pos:pos + 1] in ('\n', b'\n'):
+                    # At the end of a line, reset the state to root
+                    statestack[:] = ['root']
+                    statetokens = tokendefs['root']
+                    yield pos, pos + 1, MToken.WHITESPACE
+                else:
+                    yield pos, pos + 1, MToken.UNKNOWN
+                pos += 1
+
+
+# Options that don't change the tokens returned by the lexer unless it degrades to Text, which are left
+# out of cache keys
+RUNTIME_OPTIONS = frozenset(('cache', 'cancel', 'deadline_ms', 'max_tokens', 'on_degrade'))
+
+# Token types whose values are shared when the intern option is set, and the preallocated values of
+# the builtins
+INTERNED_TOKENS = frozenset((MToken.BUILTIN, MToken.GROUP, MToken.LOCAL_SCOPE, MToken.OPERATOR,
+                             MToken.PRIVATE, MToken.SYMBOL, MToken.WHITESPACE))
+BUILTIN_VALUES = dict((symbol, symbol) for symbol in mma.SYSTEM_SYMBOLS)
+
+# Token types whose values the annotations need in order to classify them
+VALUE_TOKENS = frozenset((MToken.GROUP, MToken.OPERATOR, MToken.PATTERN, MToken.SYMBOL,
+                          MToken.UNKNOWN))
+
 
 class _State(dict):
     def __getattr__(self, attr):
@@ -106,9 +398,21 @@ class _State(dict):
 
 
 class MathematicaAnnotations:
+    # Increment version whenever the annotations change the tokens they return, since it is part
+    # of the lexer fingerprint that caches use for invalidation.
+    version = 5
+
     def __init__(self):
         self.scope = _State()
         self._reset_scope_state()
+        self.patterns = _State()
+        self._reset_pattern_state()
+        self.context = _State()
+        self._reset_context_state()
+
+    def annotations(self):
+        # The annotations in the order in which they are applied to each token
+        return (self.builtins, self.unicode, self.lexical_scope, self.pattern_scope, self.contexts)
 
     @staticmethod
     def builtins(index, token, value):
@@ -120,20 +424,19 @@ class MathematicaAnnotations:
     @staticmethod
     def unicode(index, token, value):
         if token is MToken.UNKNOWN:
-            if value in mma.UNICODE_SYSTEM_SYMBOLS:
-                new_token = MToken.BUILTIN
-            elif value in mma.UNICODE_GROUPINGS:
-                new_token = MToken.GROUP
-            elif value in mma.UNICODE_OPERATORS:
-                new_token = MToken.OPERATOR
-            elif value in mma.UNICODE_SYSTEM_UNDEFINED_SYMBOLS:
-                new_token = MToken.SYMBOL
+            if len(value) > 2 and value.startswith('\\'):
+                # Character codes such as \:03b1 are case insensitive in their hex digits
+                new_token = ESCAPED_CHARACTERS.get(value.lower())
+                if new_token is None:
+                    new_token = MToken.SYMBOL if _decode_character(value).isalpha() else token
             else:
-                new_token = MToken.UNKNOWN
+                new_token = _character_token(value)
             return index, new_token, value
         elif token is MToken.SYMBOL and value in mma.UNICODE_SYSTEM_SYMBOLS:
             new_token = MToken.BUILTIN
             return index, new_token, value
+        elif token is MToken.SYMBOL and value.startswith('\\['):
+            return index, ESCAPED_CHARACTERS.get(value, token), value
         else:
             return index, token, value
 
@@ -281,3 +584,187 @@ class MathematicaAnnotations:
 
         self.scope.keyword = False
         return index, token, value
+
+    def _reset_pattern_state(self):
+        # depth is the nestedness of groupings ([, {, (, <|, etc.) at the current token
+        self.patterns.depth = 0
+
+        # names is a flat stack of the pattern names seen in the current top level expression and
+        # starts holds the index into names where the current subexpression at each depth began.
+        # A closed group leaves its names in place so that they count towards the enclosing
+        # expression (as in f[x_, y_] := ...), and names is only cleared at the end of a top level
+        # expression, so every name is pushed and popped exactly once.
+        self.patterns.names = []
+        self.patterns.starts = [0]
+
+        # definitions is a stack of (depth, names) for each := or :> whose RHS is being parsed and
+        # bound counts how many of those definitions bind a given name.
+        self.patterns.definitions = []
+        self.patterns.bound = defaultdict(int)
+
+        # last is the type and value of the preceding non-whitespace token, used to decide whether
+        # a newline at the top level ends the expression.
+        self.patterns.last = (None, None)
+
+    def _end_expression(self):
+        # The RHS of a definition ends at a separator (, or ;) at its own depth
+        state = self.patterns
+        definitions = state.definitions
+        while definitions and definitions[-1][0] >= state.depth:
+            for name in definitions.pop()[1]:
+                state.bound[name] -= 1
+
+        if not state.depth:
+            del state.names[:]
+        state.starts[-1] = len(state.names)
+
+    def pattern_scope(self, index, token, value):
+        state = self.patterns
+        if token is MToken.WHITESPACE:
+            # A newline at the top level ends the expression unless it is incomplete, i.e. the last
+            # token was an infix or prefix operator (as in f[x_] :=\n x).
+            last_token, last_value = state.last
+            if (not state.depth and '\n' in value and
+                    (last_token is not MToken.OPERATOR or last_value in POSTFIX_OPERATORS)):
+                self._end_expression()
+            return index, token, value
+
+        state.last = (token, value)
+
+        if token is MToken.GROUP:
+            if value in OPEN_GROUPINGS:
+                state.depth += 1
+                state.starts.append(len(state.names))
+            elif value in CLOSE_GROUPINGS:
+                if state.depth:
+                    # The RHS of a definition extends at most to the end of the enclosing group
+                    self._end_expression()
+                    state.starts.pop()
+                    state.depth -= 1
+            elif value == ',':
+                self._end_expression()
+            return index, token, value
+
+        if token is MToken.OPERATOR:
+            if value == ';':
+                self._end_expression()
+            elif value in (':=', '^:=', ':>'):
+                # Every pattern name seen since the start of this subexpression is on the LHS
+                names = set(state.names[state.starts[-1]:])
+                state.starts[-1] = len(state.names)
+                if names:
+                    state.definitions.append((state.depth, names))
+                    for name in names:
+                        state.bound[name] += 1
+            return index, token, value
+
+        if token is MToken.PATTERN:
+            name = value.split('_', 1)[0].rstrip(':')
+            if name:
+                state.names.append(name)
+            return index, token, value
+
+        if token in (MToken.SYMBOL, MToken.BUILTIN) and state.bound.get(value):
+            return index, MToken.LOCAL_SCOPE, value
+
+        return index, token, value
+
+    def _reset_context_state(self):
+        # stack holds the contexts entered with BeginPackage and Begin, the innermost being current.
+        # package is the context of the innermost BeginPackage and exported is the set of symbols
+        # that were mentioned in its public section, before any Begin.
+        self.context.stack = ['Global`']
+        self.context.package = None
+        self.context.exported = set()
+
+        # function is the context function (Begin, End, etc.) whose arguments are being parsed and
+        # stage is how far the parser has progressed in its first argument ([, then " and then the
+        # context name).
+        self.context.function = None
+        self.context.stage = None
+
+        # resolved memoizes the token of each (context, symbol) pair and is cleared whenever the
+        # context changes, since a resolution also depends on the exported symbols.
+        self.context.resolved = {}
+
+    def _enter_context(self, function, name):
+        state = self.context
+        if name.startswith('`'):
+            name = state.stack[-1] + name[1:]
+
+        if function == 'BeginPackage':
+            state.package = name
+            state.exported = set()
+
+        state.stack.append(name)
+        state.resolved = {}
+
+    def _exit_context(self, function):
+        state = self.context
+        if len(state.stack) > 1:
+            state.stack.pop()
+
+        if function == 'EndPackage':
+            state.package = None
+            state.exported = set()
+
+        state.resolved = {}
+
+    def _resolve_symbol(self, context, value):
+        if '`' in value:
+            if value.startswith('`'):
+                value = context + value[1:]
+
+            symbol_context, _, name = value.rpartition('`')
+            if symbol_context == 'System' and name in mma.SYSTEM_SYMBOLS:
+                return MToken.BUILTIN
+            elif symbol_context.endswith('`Private') and name:
+                return MToken.PRIVATE
+            else:
+                return MToken.SYMBOL
+
+        if context.endswith('`Private`') and value not in self.context.exported:
+            return MToken.PRIVATE
+        else:
+            return MToken.SYMBOL
+
+    def contexts(self, index, token, value):
+        state = self.context
+        if token is MToken.WHITESPACE:
+            return index, token, value
+
+        if state.function:
+            # Parse just enough of Begin["ctx`"], BeginPackage["ctx`", ...], End[] and EndPackage[]
+            # to track the context. Anything unexpected abandons the parse.
+            function, stage = state.function, state.stage
+            state.function = state.stage = None
+            if stage is None and token is MToken.GROUP and value == '[':
+                if function in ('End', 'EndPackage'):
+                    self._exit_context(function)
+                else:
+                    state.function, state.stage = function, '['
+            elif stage == '[' and token is MToken.STRING and value == '"':
+                state.function, state.stage = function, '"'
+            elif stage == '"' and token is MToken.STRING and value.endswith('`'):
+                self._enter_context(function, value)
+
+            return index, token, value
+
+        if token is MToken.BUILTIN and value in CONTEXT_FUNCTIONS:
+            state.function = value
+            return index, token, value
+
+        if token is MToken.SYMBOL:
+            context = state.stack[-1]
+            if context == state.package and '`' not in value:
+                state.exported.add(value)
+                return index, token, value
+
+            key = (context, value)
+            new_token = state.resolved.get(key)
+            if new_token is None:
+                new_token = state.resolved[key] = self._resolve_symbol(context, value)
+
+            return index, new_token, value
+
+        return index, token, value
@@ -0,0 +1,481 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import accumulate
+
+import pygments
+
+from mathematica.cache import DiskCache
+from mathematica.lexer import MathematicaLexer
+from mathematica.parallel import highlight_many
+
+# A Cell[content, style, options...] expression of a notebook: the offsets of the expression and of
+# its first argument, and the style if the second argument is a string (None for cell groups and
+# inline cells). Offsets are in the units of the scanned data: characters of a str, or bytes.
+Cell = namedtuple('Cell', ['start', 'end', 'content_start', 'content_end', 'style'])
+
+# A Cell of an index, with a hash of its content
+IndexedCell = namedtuple('IndexedCell', Cell._fields + ('hash', ))
+
+# The styles of the cells that hold code
+CODE_STYLES = frozenset(('Input', 'Code'))
+
+# The scanner only stops at strings (which are skipped as a whole, including the megabytes of
+# CompressedData), comments, Cell heads and brackets. Everything else, such as the numbers of
+# graphics, is skipped by the regex engine.
+TOKENS = r'''(?P<string>"[^"\\]*(?:\\.[^"\\]*)*")|(?P<comment>\(\*)|(?P<cell>(?<![\w$])Cell\[)
+           |(?P<open>\[)|(?P<close>\])'''
+COMMENT = r'\(\*|\*\)'
+STYLE = r'\s*,\s*"([^"\\]*)"'
+
+# An index is saved next to its notebook, as notebook.nb.cells.json
+INDEX_SUFFIX = '.cells.json'
+INDEX_VERSION = 1
+
+_PATTERNS = {
+    str: tuple(re.compile(pattern, re.VERBOSE | re.DOTALL) for pattern in (TOKENS, COMMENT, STYLE)),
+    bytes: tuple(re.compile(pattern.encode('ascii'), re.VERBOSE | re.DOTALL)
+                 for pattern in (TOKENS, COMMENT, STYLE)),
+}
+
+
+def scan_cells(data):
+    """Yields a Cell for each cell expression of data, the text of a notebook as a str or a bytes-like
+    object such as an mmap, in a single pass that only tracks strings, comments and brackets. Each
+    cell is yielded as soon as it ends, so cells of a group come before the group."""
+    tokens, comment, style = _PATTERNS[str if isinstance(data, str) else bytes]
+    search = tokens.search
+    # The open brackets: None for a bracket, or a cell as a list of its fields, the last of which
+    # is False until the end of its content is known
+    stack = []
+    pos = 0
+    while True:
+        m = search(data, pos)
+        if m is None:
+            break
+
+        kind = m.lastgroup
+        pos = m.end()
+        if kind == 'open':
+            stack.append(None)
+            continue
+        elif kind == 'cell':
+            stack.append([m.start(), pos, pos, None, False])
+            continue
+        elif kind == 'comment':
+            pos = _skip_comment(data, pos, comment)
+            continue
+        elif kind == 'close':
+            if not stack:
+                continue
+            frame = stack.pop()
+            if frame is not None:
+                if not frame[4]:
+                    frame[2] = m.start()
+                yield Cell(frame[0], pos, frame[1], frame[2], frame[3])
+
+        # A string or a closing bracket directly in a cell ends its first argument, which is followed
+        # by the style
+        if stack and stack[-1] is not None and not stack[-1][4]:
+            frame = stack[-1]
+            frame[2] = pos
+            frame[4] = True
+            match = style.match(data, pos)
+            if match is not None:
+                value = match.group(1)
+                frame[3] = value if isinstance(value, str) else str(value, 'latin-1')
+
+
+def _skip_comment(data, pos, comment):
+    # Comments nest
+    depth = 1
+    while depth:
+        m = comment.search(data, pos)
+        if m is None:
+            return len(data)
+        depth += 1 if m.group()[:1] in ('(', b'(') else -1
+        pos = m.end()
+    return pos
+
+
+def code_cells(data, styles=CODE_STYLES):
+    """Yields the cells of data whose style is in styles, in the order in which they appear."""
+    for cell in scan_cells(data):
+        if cell.style in styles:
+            yield cell
+
+
+# The tokens of box expressions. Whitespace between them isn't part of the code.
+BOX_TOKENS = re.compile(r'''(?P<string>"[^"\\]*(?:\\.[^"\\]*)*")|(?P<head>[a-zA-Z$][\w$`]*)\s*\[
+                          |(?P<open>[{\[])|(?P<close>[\]}])|(?P<comma>,)|(?P<space>\s+)
+                          |(?P<other>[^"\[\]{},\s]+)''', re.VERBOSE | re.DOTALL)
+ESCAPE = re.compile(r'\\(?:\[[a-zA-Z]+\]|.)', re.DOTALL)
+
+# The escape sequences of strings in boxes that stand for other text. Others, such as named
+# characters, are left as they are since the lexer knows them.
+ESCAPES = {
+    '\\"': '"',
+    '\\\\': '\\',
+    '\\n': '\n',
+    '\\t': '\t',
+    '\\\n': '',
+    # Delimiters of long strings
+    '\\<': '',
+    '\\>': '',
+    '\\[IndentingNewLine]': '\n',
+    '\\[InvisibleSpace]': '',
+    '\\[InvisibleTimes]': ' ',
+}
+
+# How boxes are written as code: (prefix, separators between the arguments that are written,
+# suffix, arguments that are parenthesized unless they are a single string, whether the lists in
+# the arguments are lists of the code rather than rows). Only the first len(separators) + 1
+# arguments are written, so options are left out. Boxes that aren't listed here (e.g. GraphicsBox)
+# are written as they are.
+_ROW = ('', (), '', (), False)
+BOX_TEMPLATES = {
+    'BoxData': _ROW,
+    'RowBox': _ROW,
+    'TextData': _ROW,
+    'StyleBox': _ROW,
+    'TagBox': _ROW,
+    'FormBox': _ROW,
+    'InterpretationBox': _ROW,
+    'ButtonBox': _ROW,
+    'FrameBox': _ROW,
+    'AdjustmentBox': _ROW,
+    'ItemBox': _ROW,
+    'PaneBox': _ROW,
+    'TooltipBox': _ROW,
+    'SuperscriptBox': ('', ('^', ), '', (0, 1), False),
+    'SubscriptBox': ('Subscript[', (', ', ), ']', (), False),
+    'SubsuperscriptBox': ('Subscript[', (', ', ']^'), '', (2, ), False),
+    'FractionBox': ('', ('/', ), '', (0, 1), False),
+    'SqrtBox': ('Sqrt[', (), ']', (), False),
+    'RadicalBox': ('Surd[', (', ', ), ']', (), False),
+    'UnderscriptBox': ('Underscript[', (', ', ), ']', (), False),
+    'OverscriptBox': ('Overscript[', (', ', ), ']', (), False),
+    'UnderoverscriptBox': ('Underoverscript[', (', ', ', '), ']', (), False),
+    'GridBox': ('', (), '', (), True),
+}
+
+# The version of flatten_boxes, to be incremented when it writes boxes differently
+FLATTEN_VERSION = 1
+
+# The kinds of frames of flatten_boxes
+_BOX, _ROW_LIST, _LIST, _VERBATIM = range(4)
+
+
+class BoxText(namedtuple('BoxText', ['text', 'starts', 'sources'])):
+    """The code of some boxes, and where its characters come from: the characters from starts[k]
+    on come from the offsets from sources[k] on in the notebook."""
+    __slots__ = ()
+
+    def source(self, index):
+        """Returns the offset in the notebook of the character at index of text."""
+        k = max(0, bisect_right(self.starts, index) - 1)
+        return self.sources[k] + index - self.starts[k] if self.starts else index
+
+    def map_tokens(self, tokens):
+        """Yields tokens of text with their offsets replaced by offsets in the notebook. tokens
+        must be in order, as returned by a lexer."""
+        starts, sources = self.starts, self.sources
+        k = 0
+        last = len(starts) - 1
+        for index, token, value in tokens:
+            while k < last and starts[k + 1] <= index:
+                k += 1
+            yield (sources[k] + index - starts[k] if starts else index), token, value
+
+
+def flatten_boxes(data, start=0, end=None, encoding='utf-8'):
+    """Returns a BoxText with the code that the boxes in data[start:end] display, e.g. f[x] for
+    RowBox[{"f", "[", "x", "]"}] and x^(n+1) for SuperscriptBox["x", RowBox[{"n", "+", "1"}]].
+    Strings are unescaped. data is a str or a bytes-like object such as an mmap, in which case
+    offsets are bytes.
+
+    The boxes are read in a single pass with an explicit stack, so that time and memory are linear
+    in the size of the boxes however deeply they nest."""
+    if end is None:
+        end = len(data)
+    chunk = data[start:end]
+    if not isinstance(chunk, str):
+        chunk = str(chunk, encoding)
+
+    out = []
+    starts = array('q')
+    sources = array('q')
+    # The length of the text so far, and the offset in chunk of the character that would follow
+    # the last one written
+    state = [0, -1]
+
+    def emit(text, source):
+        if text:
+            if source != state[1]:
+                starts.append(state[0])
+                sources.append(source)
+            out.append(text)
+            state[0] += len(text)
+            state[1] = source + len(text)
+
+    def emit_string(pos, value):
+        # value is the string literal at pos, with its quotes
+        content = value[1:-1]
+        pos += 1
+        if '\\' not in content:
+            emit(content, pos)
+            return
+
+        last = 0
+        for m in ESCAPE.finditer(content):
+            emit(content[last:m.start()], pos + last)
+            escape = m.group()
+            emit(ESCAPES.get(escape, escape), pos + m.start())
+            last = m.end()
+        emit(content[last:], pos + last)
+
+    # Each frame is [kind, whether its current argument is written, template, argument index,
+    # start, whether the current argument is parenthesized]. The content of the cell is written
+    # like a row.
+    stack = [[_ROW_LIST, True, None, 0, 0, False]]
+    match = BOX_TOKENS.match
+    pos = 0
+    length = len(chunk)
+    while pos < length:
+        m = match(chunk, pos)
+        if m is None:
+            # An unmatched character, such as a quote that isn't closed
+            if stack[-1][1]:
+                emit(chunk[pos], pos)
+            pos += 1
+            continue
+
+        kind = m.lastgroup
+        start_pos, pos = pos, m.end()
+        frame = stack[-1]
+        writing = frame[1]
+        if kind == 'space':
+            continue
+
+        if writing and frame[0] == _BOX and frame[5] is None:
+            # The first token of an argument that is parenthesized unless it is a single string
+            frame[5] = kind != 'string'
+            if frame[5]:
+                emit('(', start_pos)
+
+        if kind == 'string':
+            if writing:
+                emit_string(start_pos, m.group())
+        elif kind == 'other':
+            if writing:
+                emit(m.group(), start_pos)
+        elif kind == 'head':
+            template = BOX_TEMPLATES.get(m.group('head')) if writing else None
+            if template is None:
+                stack.append([_VERBATIM, False, None, 0, start_pos, False])
+            else:
+                emit(template[0], start_pos)
+                stack.append([_BOX, True, template, 0, start_pos, None if 0 in template[3]
+                              else False])
+        elif kind == 'open':
+            if not writing or m.group() == '[':
+                stack.append([_VERBATIM, False, None, 0, start_pos, False])
+            elif frame[0] == _BOX and frame[2][4] or frame[0] == _LIST:
+                emit('{', start_pos)
+                stack.append([_LIST, True, None, 0, start_pos, False])
+            else:
+                stack.append([_ROW_LIST, True, None, 0, start_pos, False])
+        elif kind == 'comma':
+            if frame[0] == _BOX:
+                template = frame[2]
+                if frame[1] and frame[5]:
+                    emit(')', start_pos)
+                index = frame[3] = frame[3] + 1
+                frame[1] = stack[-2][1] and index <= len(template[1])
+                if frame[1]:
+                    emit(template[1][index - 1], start_pos)
+                frame[5] = None if index in template[3] else False
+            elif frame[0] == _LIST and writing:
+                emit(', ', start_pos)
+        elif len(stack) > 1:
+            # A closing bracket or brace
+            stack.pop()
+            if frame[0] == _BOX:
+                if frame[1] and frame[5]:
+                    emit(')', start_pos)
+                if stack[-1][1]:
+                    emit(frame[2][2], start_pos)
+            elif frame[0] == _LIST:
+                emit('}', start_pos)
+            elif frame[0] == _VERBATIM and stack[-1][1]:
+                # A box that isn't known is written as it is
+                emit(chunk[frame[4]:pos], frame[4])
+
+    text = ''.join(out)
+    if len(chunk) != end - start:
+        # Offsets in chunk are characters, but offsets in data are bytes
+        offsets = array('q', accumulate((len(c.encode(encoding)) for c in chunk), initial=0))
+        sources = array('q', (offsets[source] for source in sources))
+    return BoxText(text, starts, array('q', (start + source for source in sources)))
+
+
+def cell_code(data, cell, encoding='utf-8'):
+    """Returns a BoxText with the code of cell, which maps the offsets of the code to offsets in
+    data. The code of Cell["f[x_] := x", "Code"] is the text of the string, and that of a cell of
+    boxes is the code that they display (see flatten_boxes)."""
+    return flatten_boxes(data, cell.content_start, cell.content_end, encoding)
+
+
+def lex_notebook(data, lexer=None, styles=CODE_STYLES, encoding='utf-8'):
+    """Yields (cell, tokens) for each code cell of data (a str, or a bytes-like object such as an
+    mmap), where tokens is the list of tokens of its code with their offsets in data. The code of
+    a cell of boxes is flattened with flatten_boxes, and the offset of each token is that of its
+    first character in data. Output, graphics and text cells are skipped without being lexed."""
+    if lexer is None:
+        lexer = MathematicaLexer()
+
+    for cell in code_cells(data, styles):
+        code = cell_code(data, cell, encoding)
+        yield cell, list(code.map_tokens(lexer.get_tokens_unprocessed(code.text)))
+
+
+def highlight_notebook(data, formatter, lexer=None, styles=CODE_STYLES, encoding='utf-8'):
+    """Yields (cell, output) for each code cell of data, where output is the code of the cell
+    highlighted with formatter."""
+    if lexer is None:
+        lexer = MathematicaLexer()
+
+    for cell in code_cells(data, styles):
+        yield cell, highlight_cell(data, cell, formatter, lexer, encoding)
+
+
+def index_cells(data):
+    """Returns an IndexedCell for each cell of data, in the order in which the cells start, in a
+    single pass over data. data is usually the mmap of a notebook, so that offsets are bytes.
+
+    The hash of a cell covers its whole text. It is computed from the text of the cell outside of
+    the cells it contains and from their hashes, so that each byte is only hashed once."""
+    cells = []
+    # The cells whose group hasn't ended yet, in the order in which they end
+    pending = []
+    for cell in scan_cells(data):
+        first = len(pending)
+        while first and pending[first - 1].start >= cell.start:
+            first -= 1
+        children = pending[first:]
+        del pending[first:]
+
+        digest = hashlib.blake2b(digest_size=16)
+        pos = cell.start
+        for child in children:
+            digest.update(_encode(data[pos:child.start]))
+            digest.update(child.hash.encode('ascii'))
+            pos = child.end
+        digest.update(_encode(data[pos:cell.end]))
+
+        indexed = IndexedCell(*cell, hash=digest.hexdigest())
+        pending.append(indexed)
+        cells.append(indexed)
+
+    cells.sort()
+    return cells
+
+
+def _encode(text):
+    return text.encode('utf-8', 'surrogatepass') if isinstance(text, str) else text
+
+
+def save_index(path, cells):
+    """Saves the index of the notebook at path next to it, along with the size and modification
+    time of the notebook, which load_index checks."""
+    stat = os.stat(path)
+    data = json.dumps({
+        'version': INDEX_VERSION,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'cells': [list(cell) for cell in cells],
+    }, separators=(',', ':'))
+
+    index_path = path + INDEX_SUFFIX
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(index_path)),
+                                    prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def load_index(path):
+    """Returns the saved index of the notebook at path, or None if there is none or the notebook
+    has changed since it was saved."""
+    try:
+        stat = os.stat(path)
+        with open(path + INDEX_SUFFIX, encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (index.get('version') != INDEX_VERSION or index.get('size') != stat.st_size or
+            index.get('mtime_ns') != stat.st_mtime_ns):
+        return None
+    return [IndexedCell(*cell) for cell in index['cells']]
+
+
+def index_notebook(path, data):
+    """Returns the index of the notebook at path, whose content is data (e.g. its mmap), loading it
+    from the saved index if it is up to date, and building and saving it otherwise."""
+    cells = load_index(path)
+    if cells is None:
+        cells = index_cells(data)
+        save_index(path, cells)
+    return cells
+
+
+def highlight_cell(data, cell, formatter, lexer=None, encoding='utf-8'):
+    """Returns the code of cell (a Cell or an IndexedCell of data) highlighted with formatter. Only
+    the text of the cell is read, so with an index, a cell of a large notebook is highlighted in
+    time proportional to its size."""
+    code = cell_code(data, cell, encoding).text
+    return pygments.highlight(code, lexer or MathematicaLexer(), formatter)
+
+
+def rehighlight_notebook(data, formatter, cache, cells=None, styles=CODE_STYLES, workers=None,
+                         encoding='utf-8'):
+    """Returns [(cell, output)] for the code cells of data like highlight_notebook, but looks up the
+    output of each cell in cache (e.g. a DiskCache) by the hash of the cell, so that after an edit
+    only the cells that changed are highlighted. Those are highlighted in parallel by workers
+    processes as in highlight_many. cells is the index of data, which is built if None."""
+    if cells is None:
+        cells = index_cells(data)
+
+    # The formatter, style and lexer part of the keys is the same for all cells. The version of
+    # flatten_boxes is part of it since it changes the code of a cell with the same hash.
+    base = DiskCache.key('', formatter) + str(FLATTEN_VERSION)
+    results = []
+    changed = []
+    for cell in cells:
+        if cell.style in styles:
+            key = hashlib.sha256((base + cell.hash).encode('ascii')).hexdigest()
+            output = cache.get(key)
+            if output is None:
+                changed.append(len(results))
+            results.append([cell, key, output])
+
+    codes = [cell_code(data, results[i][0], encoding).text for i in changed]
+    for i, output in zip(changed, highlight_many(codes, formatter, workers=workers)):
+        results[i][2] = output
+        cache.set(results[i][1], output)
+
+    return [(cell, output) for cell, _, output in results]
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import pygments
+from pygments.formatters import get_formatter_by_name
+
+from mathematica import serialize
+from mathematica.lexer import NUMBER_TAILS, MathematicaAnnotations, MathematicaLexer, Regex
+
+# The prescan only looks for the tokens that change the lexer state (strings and comments) or the
+# nesting of groupings, and for blank lines. Slots such as #"name" and named characters such as
+# \[Alpha] are matched so that their quotes and brackets aren't mistaken for the others.
+PRESCAN = re.compile(r'''
+    (?P<skip>\#"{symbols}"|\\\[(?!Left|Right)[^\]\s]*\])
+  | (?P<string>")
+  | (?P<comment>\(\*)
+  | (?P<open>[(\[{{]|<\||〈|〈|〚|\\\[Left(?:AngleBracket|DoubleBracket)\])
+  | (?P<close>[)\]}}]|\|>|〉|〉|〛|\\\[Right(?:AngleBracket|DoubleBracket)\])
+  | (?P<blank>\n[^\S\n]*\n\s*)
+'''.format(symbols=Regex.SYMBOLS), re.VERBOSE)
+
+# Characters that leave an expression incomplete at the end of a line, in which case the following
+# lines continue it. Splitting there could change how the definition scopes are annotated.
+CONTINUATION = re.compile(r'''([-+*/^=<>!&|@~:.?'`,;\\_#]|[^\w\s\x00-\x7f]|\\\[[a-zA-Z]+\]|
+                             \b(Block|With|Module))\Z''', re.VERBOSE)
+
+
+def _skip_state(lexer, text, pos, state):
+    # Runs the rules of the given state (strings or comments) exactly as the lexer does, until the
+    # lexer is back in the root state, and returns the position at which that happens.
+    tokendefs = lexer._tokens
+    statestack = ['root', state]
+    while len(statestack) > 1:
+        for rexmatch, _, new_state in tokendefs[statestack[-1]]:
+            m = rexmatch(text, pos)
+            if m:
+                pos = m.end()
+                if new_state == -1:
+                    statestack.pop()
+                elif new_state == '#push':
+                    statestack.append(statestack[-1])
+                break
+        else:
+            if pos >= len(text):
+                return pos
+            elif text[pos] == '\n':
+                return pos + 1
+            pos += 1
+
+    return pos
+
+
+def split_points(text, lexer=None):
+    """Returns the offsets in text at which the lexer is expected to be in the root state with no
+    open groupings, outside of any comment or string: the first character after one or more blank
+    lines, when the preceding line completes an expression."""
+    if lexer is None:
+        lexer = MathematicaLexer()
+
+    points = []
+    depth = 0
+    pos = 0
+    while True:
+        m = PRESCAN.search(text, pos)
+        if m is None:
+            return points
+
+        kind = m.lastgroup
+        pos = m.end()
+        if kind == 'string':
+            pos = _skip_state(lexer, text, pos, 'strings')
+        elif kind == 'comment':
+            pos = _skip_state(lexer, text, pos, 'comments')
+        elif kind == 'open':
+            depth += 1
+        elif kind == 'close':
+            depth = max(depth - 1, 0)
+        elif (kind == 'blank' and not depth and pos < len(text) and
+              not text.startswith(NUMBER_TAILS, pos) and
+              not CONTINUATION.search(text[max(0, m.start() - 8):m.start()].rstrip())):
+            points.append(pos)
+
+
+def _annotate(text):
+    # Returns the tokens of text with every annotation except contexts, which span the whole file
+    # and are therefore applied after the chunks are stitched together, and whether the lexer and
+    # the annotations end up in the state they start in, so that the lexing of the text after it
+    # can start afresh.
+    lexer = MathematicaLexer()
+    ma = MathematicaAnnotations()
+    annotations = (ma.builtins, ma.unicode, ma.lexical_scope, ma.pattern_scope)
+    statestack = []
+    tokens = []
+    for start, end, token in lexer._get_spans(text, ('root', ), statestack):
+        result = (start, token, text[start:end])
+        for func in annotations:
+            result = func(*result)
+        tokens.append(result)
+
+    fresh = MathematicaAnnotations()
+    complete = (statestack == ['root'] and _state(ma.scope) == _state(fresh.scope) and
+                _state(ma.patterns) == _state(fresh.patterns))
+    return tokens, complete
+
+
+def _state(state):
+    # Counters that have dropped back to zero are the same as missing ones. The last token seen by
+    # pattern_scope is left out, since the next chunk starts with a token that replaces it.
+    return dict((name, dict((k, v) for k, v in value.items() if v) if isinstance(value, dict)
+                 else value) for name, value in state.items() if name != 'last')
+
+
+def _lex_chunk(text):
+    tokens, complete = _annotate(text)
+    return serialize.dumps(tokens), complete
+
+
+def parallel_lex(text, workers=None, lexer=None, executor=None, min_chunk_size=64 * 1024):
+    """Returns the same tokens as lexer.get_tokens_unprocessed(text), lexing chunks of text that
+    are split at blank lines between top level expressions (see split_points) in a pool of worker
+    processes. Lexing is serial if text has no such split points or is shorter than twice
+    min_chunk_size. workers defaults to the number of CPUs.
+
+    An existing concurrent.futures executor can be passed to avoid starting new processes."""
+    if lexer is None:
+        lexer = MathematicaLexer()
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    chunks = _chunks(text, lexer, workers, min_chunk_size) if executor or workers > 1 else []
+    if len(chunks) < 2:
+        return list(lexer.get_tokens_unprocessed(text))
+
+    texts = [text[start:end] for start, end in chunks]
+    if executor is None:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_lex_chunk, texts))
+    else:
+        results = list(executor.map(_lex_chunk, texts))
+
+    ma = MathematicaAnnotations()
+    tokens = []
+    for (start, end), chunk, (data, complete) in zip(chunks, texts, results):
+        if complete or end == len(text):
+            chunk_tokens = serialize.loads(data, chunk)
+        else:
+            # The prescan was wrong about the state at the end of this chunk (e.g. an unbalanced
+            # bracket), so the rest of the text is lexed serially from the start of this chunk,
+            # which is known to be lexed correctly from the initial state.
+            chunk_tokens = _annotate(text[start:])[0]
+
+        for index, token, value in chunk_tokens:
+            tokens.append(ma.contexts(index + start, token, value))
+
+        if not complete:
+            break
+
+    return list(lexer._intern_values(tokens)) if lexer.intern else tokens
+
+
+def _chunks(text, lexer, workers, min_chunk_size):
+    # Aim for a few chunks per worker so that uneven chunks still balance out
+    if len(text) < 2 * min_chunk_size:
+        return []
+
+    size = max(min_chunk_size, len(text) // (4 * workers))
+    chunks = []
+    start = 0
+    for point in split_points(text, lexer):
+        if point - start >= size:
+            chunks.append((start, point))
+            start = point
+
+    chunks.append((start, len(text)))
+    return chunks
+
+
+# The pool of highlight_many as (pid, workers, executor). It is kept between calls so that its
+# workers only import the package and compile the lexing rules once.
+_pool = None
+_pool_lock = threading.Lock()
+# The lexer of each worker process
+_worker_lexer = None
+
+
+def worker_lexer():
+    """Returns the MathematicaLexer of this process, which is created and has lexed a first
+    snippet by the time it is returned, so that its rules are compiled. The workers of get_pool
+    create it when they start. It is shared by the threads of the process."""
+    global _worker_lexer
+    if _worker_lexer is None:
+        lexer = MathematicaLexer()
+        list(lexer.get_tokens_unprocessed('f[x_] := x'))
+        _worker_lexer = lexer
+    return _worker_lexer
+
+
+def _highlight(formatter, code):
+    return pygments.highlight(code, worker_lexer(), formatter)
+
+
+def get_pool(workers=None):
+    """Returns the process pool used by highlight_many, starting it if it isn't running or has a
+    different number of workers. Its workers have the lexer ready before the first snippet."""
+    global _pool
+    workers = workers or os.cpu_count() or 1
+    with _pool_lock:
+        # A forked child can't use the pool of its parent
+        if _pool is None or _pool[:2] != (os.getpid(), workers):
+            if _pool is not None and _pool[0] == os.getpid():
+                _pool[2].shutdown(wait=False)
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=worker_lexer)
+            _pool = (os.getpid(), workers, executor)
+
+        return _pool[2]
+
+
+def shutdown_pool():
+    """Stops the workers of highlight_many."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool[0] == os.getpid():
+            _pool[2].shutdown()
+        _pool = None
+
+
+def highlight_many(snippets, formatter, style=None, workers=None, cache=None, chunksize=None):
+    """Highlights each code snippet in snippets with the formatter in a pool of worker processes,
+    and returns an iterator over the results in the order of snippets, which yields each result as
+    soon as it is ready. Identical snippets are only highlighted once.
+
+    formatter is a formatter instance, or a formatter class or name which is instantiated with
+    style. When cache is given (e.g. a DiskCache), snippets are looked up there first and the
+    results are stored in it. Snippets are sent to the workers in batches of chunksize, which
+    defaults to a size that gives each worker several batches. With workers=1, the snippets are
+    highlighted in this process."""
+    if isinstance(formatter, str):
+        formatter = get_formatter_by_name(formatter, **({'style': style} if style else {}))
+    elif isinstance(formatter, type):
+        formatter = formatter(**({'style': style} if style else {}))
+    elif style is not None:
+        raise ValueError('style can only be given with a formatter name or class')
+
+    workers = workers or os.cpu_count() or 1
+    snippets = list(snippets)
+
+    # Each distinct snippet is highlighted once, in the order in which it first appears
+    positions = {}
+    for code in snippets:
+        positions.setdefault(code, len(positions))
+
+    results = [None] * len(positions)
+    keys = [None] * len(positions)
+    pending = []
+    lexer = MathematicaLexer()
+    for code, i in positions.items():
+        if cache is not None:
+            keys[i] = cache.key(code, formatter, lexer)
+            results[i] = cache.get(keys[i])
+        if results[i] is None:
+            pending.append(i)
+
+    highlight = partial(_highlight, formatter)
+    codes = list(positions)
+    codes = [codes[i] for i in pending]
+    if workers == 1 or len(codes) < 2:
+        highlighted = map(highlight, codes)
+    else:
+        chunksize = chunksize or max(1, min(64, len(codes) // (4 * workers)))
+        highlighted = get_pool(workers).map(highlight, codes, chunksize=chunksize)
+
+    return _ordered_results(snippets, positions, results, keys, zip(pending, highlighted), cache)
+
+
+def _ordered_results(snippets, positions, results, keys, highlighted, cache):
+    # The pool returns results in the order of submission, so a snippet waits at most for the
+    # snippets before it
+    for code in snippets:
+        i = positions[code]
+        while results[i] is None:
+            j, result = next(highlighted)
+            results[j] = result
+            if cache is not None:
+                cache.set(keys[j], result)
+
+        yield results[i]
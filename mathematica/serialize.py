@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+"""A compact binary format for token streams of the MathematicaLexer, for use in caches and for
+sending tokens between processes.
+
+A stream is stored as a byte per token that holds the token type id in its high nibble and the
+length of the token in its low nibble, followed by typed arrays of the lengths that don't fit in
+a nibble and of the gaps between tokens, each with the smallest item size that fits its values.
+The values of the tokens are not stored but sliced from the original text when the stream is
+loaded. Since the lexer emits contiguous tokens, the gaps are usually all zero and are then left
+out altogether.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+
+from mathematica.lexer import TOKEN_TYPES
+
+TOKEN_IDS = dict((token, i) for i, token in enumerate(TOKEN_TYPES))
+assert len(TOKEN_TYPES) <= 16, 'token type ids must fit in a nibble'
+
+MAGIC = b'MMTS'
+VERSION = 1
+# Lengths from LONG onwards are stored in a separate array
+LONG = 15
+# magic, version, long length typecode, gap typecode (or 0 if there are no gaps), token types
+# checksum, number of tokens, number of long lengths, offset of the first token
+HEADER = struct.Struct('<4sBcBIIII')
+TYPES_CHECKSUM = zlib.crc32(repr(TOKEN_TYPES).encode('utf-8'))
+
+
+def _typecode(values):
+    largest = max(values) if values else 0
+    if largest < 1 << 8:
+        return 'B'
+    elif largest < 1 << 16:
+        return 'H'
+    else:
+        return 'I' if array('I').itemsize == 4 else 'L'
+
+
+def _to_bytes(typecode, values):
+    data = array(typecode, values)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _from_bytes(typecode, data, start, count):
+    values = array(typecode)
+    end = start + count * values.itemsize
+    values.frombytes(data[start:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+def dumps(tokens):
+    """Serializes a sequence of (index, token type, value) tuples to bytes."""
+    tokens = list(tokens)
+    start = tokens[0][0] if tokens else 0
+    codes = bytearray()
+    long_lengths = []
+    gaps = []
+    position = start
+    for index, token, value in tokens:
+        length = len(value)
+        codes.append(TOKEN_IDS[token] << 4 | min(length, LONG))
+        if length >= LONG:
+            long_lengths.append(length)
+        gaps.append(index - position)
+        position = index + length
+
+    long_typecode = _typecode(long_lengths)
+    gap_typecode = _typecode(gaps) if any(gaps) else None
+    header = HEADER.pack(MAGIC, VERSION, long_typecode.encode('ascii'),
+                         ord(gap_typecode) if gap_typecode else 0, TYPES_CHECKSUM, len(tokens),
+                         len(long_lengths), start)
+    return b''.join((
+        header,
+        bytes(codes),
+        _to_bytes(long_typecode, long_lengths),
+        _to_bytes(gap_typecode, gaps) if gap_typecode else b'',
+    ))
+
+
+def loads(data, text):
+    """Deserializes the bytes returned by dumps to a list of (index, token type, value) tuples,
+    taking the values from text, which must be the text the tokens were lexed from."""
+    magic, version, long_typecode, gap_typecode, checksum, count, long_count, position = \
+        HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError('not a serialized token stream')
+    if checksum != TYPES_CHECKSUM:
+        raise ValueError('token stream was serialized with different token types')
+
+    end = HEADER.size + count
+    codes = data[HEADER.size:end]
+    long_lengths, end = _from_bytes(long_typecode.decode('ascii'), data, end, long_count)
+    if gap_typecode:
+        gaps, end = _from_bytes(chr(gap_typecode), data, end, count)
+    else:
+        gaps = (0, ) * count
+
+    if len(codes) != count or len(long_lengths) != long_count or len(gaps) != count:
+        raise ValueError('truncated token stream')
+
+    tokens = []
+    long_lengths = iter(long_lengths)
+    for code, gap in zip(codes, gaps):
+        length = code & 0xf
+        if length == LONG:
+            length = next(long_lengths)
+        position += gap
+        tokens.append((position, TOKEN_TYPES[code >> 4], text[position:position + length]))
+        position += length
+
+    return tokens
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+# A long running highlight daemon, so that clients in other languages don't pay for starting
+# Python, importing Pygments and compiling the lexing rules on every snippet.
+#
+# Clients connect to a Unix socket or a localhost TCP port and send one JSON object per line:
+#
+#     {"id": 1, "code": "f[x_] := x^2", "formatter": "html", "options": {"style": "mathematica"},
+#      "lexer_options": {"deadline_ms": 200}}
+#
+# All fields but code are optional; formatter defaults to html. Only the text formatters in
+# FORMATTERS and the options in FORMATTER_OPTIONS and LEXER_OPTIONS are accepted, since others
+# write files (e.g. cssfile) or read them (e.g. the fonts of the image formatters) on the server,
+# or aren't meant to come from JSON (e.g. the cache and callbacks of the lexer). Each request is
+# answered by one line, in the order in which the requests were received, so that any number of
+# requests can be sent before reading the responses:
+#
+#     {"id": 1, "output": "<div ...",
+#      "timing": {"queue_ms": 0.1, "highlight_ms": 1.2, "total_ms": 1.4}}
+#
+# or {"id": 1, "error": "..."} if the request failed.
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import stat
+import sys
+import time
+from functools import lru_cache
+
+import pygments
+from pygments.formatters import get_formatter_by_name
+
+from mathematica import parallel
+from mathematica.lexer import MathematicaLexer
+from mathematica.style import STYLES
+
+# The formatters that clients can use, and the options they can pass to them. Options that write
+# or read files (cssfile, tagsfile, font paths) or that change the output to bytes (encoding,
+# outencoding) are left out, as is full, which writes the cssfile.
+FORMATTERS = frozenset(('html', 'latex', 'tex', 'terminal', 'console', 'terminal256',
+                        'console256', 'terminal16m', 'console16m', '16m', 'rtf', 'svg', 'bbcode',
+                        'bb', 'irc', 'text', 'null'))
+FORMATTER_OPTIONS = frozenset((
+    'style', 'linenos', 'linenostart', 'linenostep', 'linenospecial', 'nobackground',
+    'noclasses', 'nowrap', 'classprefix', 'cssclass', 'cssstyles', 'prestyles', 'hl_lines',
+    'lineseparator', 'lineanchors', 'linespans', 'anchorlinenos', 'wrapcode', 'filename',
+    'commandprefix', 'texcomments', 'mathescape', 'escapeinside', 'envname', 'verboptions',
+    'bg', 'colorscheme', 'fontfamily', 'fontsize', 'xoffset', 'yoffset', 'ystep', 'spacehack',
+    'codetag', 'monofont',
+))
+# The options that clients can pass to the lexer
+LEXER_OPTIONS = frozenset(('deadline_ms', 'max_tokens', 'stripnl', 'stripall', 'ensurenl'))
+
+# Requests of a connection that are highlighted at the same time. Reading from the connection
+# pauses when as many responses are waiting to be written.
+MAX_PENDING = 256
+# The longest request line that is accepted
+MAX_REQUEST_BYTES = 64 * 1024 * 1024
+
+
+@lru_cache(maxsize=64)
+def _get_formatter(name, options):
+    options = dict(json.loads(options))
+    if options.get('style') in STYLES:
+        options['style'] = STYLES[options['style']]
+    return get_formatter_by_name(name, **options)
+
+
+@lru_cache(maxsize=64)
+def _get_lexer(options):
+    if options == '{}':
+        return parallel.worker_lexer()
+    return MathematicaLexer(**json.loads(options))
+
+
+def _handle(code, formatter, options, lexer_options):
+    # Runs in a worker. Formatters and lexers are created once per distinct set of options.
+    start = time.perf_counter()
+    output = pygments.highlight(code, _get_lexer(lexer_options),
+                                _get_formatter(formatter, options))
+    if not isinstance(output, str):
+        raise TypeError('the formatter returned bytes, not text')
+    return output, time.perf_counter() - start
+
+
+def _line(response):
+    return json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def _error_line(id, error):
+    # The id comes from a decoded JSON line, and the line is ASCII, so it can always be encoded
+    return json.dumps({'id': id, 'error': error}).encode('ascii') + b'\n'
+
+
+def _check_options(request, field, allowed):
+    options = request.get(field) or {}
+    if not isinstance(options, dict):
+        raise ValueError('{} is a JSON object'.format(field))
+    refused = sorted(set(options) - allowed)
+    if refused:
+        raise ValueError('{} not allowed: {}'.format(field, ', '.join(refused)))
+    return options
+
+
+async def _respond(request, received, executor):
+    # Returns the response line, so that a response that can't be encoded (e.g. output with lone
+    # surrogates) becomes an error rather than stopping the writer of the connection
+    id = request.get('id') if isinstance(request, dict) else None
+    try:
+        if not isinstance(request, dict) or not isinstance(request.get('code'), str):
+            raise ValueError('a request is a JSON object with a code string')
+
+        formatter = request.get('formatter') or 'html'
+        if formatter not in FORMATTERS:
+            raise ValueError('formatter must be one of {}'.format(', '.join(sorted(FORMATTERS))))
+        options = _check_options(request, 'options', FORMATTER_OPTIONS)
+        lexer_options = _check_options(request, 'lexer_options', LEXER_OPTIONS)
+
+        # The options are passed as JSON strings, which can be hashed to look up a formatter
+        args = (request['code'], formatter, json.dumps(options, sort_keys=True),
+                json.dumps(lexer_options, sort_keys=True))
+        loop = asyncio.get_running_loop()
+        output, elapsed = await loop.run_in_executor(executor, _handle, *args)
+
+        total = time.perf_counter() - received
+        return _line({
+            'id': id,
+            'output': output,
+            'timing': {
+                'queue_ms': round((total - elapsed) * 1000, 3),
+                'highlight_ms': round(elapsed * 1000, 3),
+                'total_ms': round(total * 1000, 3),
+            },
+        })
+    except Exception as e:
+        return _error_line(id, '{}: {}'.format(type(e).__name__, e))
+
+
+async def _write_responses(writer, responses):
+    # responses holds the response line of each request, or a task that returns it, and None
+    # after the last one. If the client goes away, the remaining responses are dropped.
+    connected = True
+    while True:
+        response = await responses.get()
+        if response is None:
+            break
+        if not isinstance(response, bytes):
+            response = await response
+        if connected:
+            try:
+                writer.write(response)
+                await writer.drain()
+            except ConnectionError:
+                connected = False
+
+
+async def _connection(reader, writer, executor):
+    # Each request is submitted as soon as it is read, and the responses are written in order by
+    # a separate task
+    responses = asyncio.Queue(MAX_PENDING)
+    writing = asyncio.ensure_future(_write_responses(writer, responses))
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # The line is longer than MAX_REQUEST_BYTES, and the connection can't be resynced
+                await responses.put(_error_line(None, 'request longer than {} bytes'.format(
+                    MAX_REQUEST_BYTES)))
+                break
+            except ConnectionError:
+                break
+            if not line:
+                break
+            if not line.strip():
+                continue
+
+            received = time.perf_counter()
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                await responses.put(_error_line(None, 'invalid JSON: {}'.format(e)))
+            else:
+                await responses.put(asyncio.ensure_future(_respond(request, received, executor)))
+
+        await responses.put(None)
+        await writing
+    finally:
+        writing.cancel()
+        writer.close()
+
+
+async def start_server(path=None, host='127.0.0.1', port=None, workers=None, executor=None):
+    """Starts the daemon on the Unix socket at path, or on host:port if path is None, and returns
+    the asyncio Server. Snippets are highlighted in executor, which defaults to the worker pool of
+    mathematica.parallel with workers processes. An existing socket at path (e.g. of a daemon that
+    was killed) is replaced, but FileExistsError is raised if path is anything else."""
+    if path is not None:
+        try:
+            mode = os.lstat(path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError('{} exists and is not a socket'.format(path))
+            os.unlink(path)
+
+    if executor is None:
+        executor = parallel.get_pool(workers)
+        # Starts the workers, which compile the lexing rules, before the first request
+        await asyncio.get_running_loop().run_in_executor(executor, len, '')
+
+    def connection(reader, writer):
+        return _connection(reader, writer, executor)
+
+    if path is not None:
+        # The socket is only accessible to its owner (0600). Its permissions are set by the umask
+        # when it is bound, so that there is no moment at which others can connect.
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o177)
+        try:
+            sock.bind(path)
+        except BaseException:
+            sock.close()
+            raise
+        finally:
+            os.umask(umask)
+        return await asyncio.start_unix_server(connection, sock=sock, limit=MAX_REQUEST_BYTES)
+    return await asyncio.start_server(connection, host, port, limit=MAX_REQUEST_BYTES)
+
+
+def serve(path=None, host='127.0.0.1', port=None, workers=None):
+    """Runs the daemon until it is interrupted. See start_server."""
+    # The socket created by the daemon, which is the only file it removes when it stops
+    created = []
+
+    async def run():
+        server = await start_server(path, host, port, workers)
+        if path is not None:
+            created.append(os.lstat(path))
+        addresses = [path] if path else ['{}:{}'.format(*sock.getsockname()[:2])
+                                          for sock in server.sockets]
+        print('pygments-mathematica listening on {}'.format(', '.join(addresses)),
+              file=sys.stderr, flush=True)
+
+        # SIGTERM stops the daemon like SIGINT does, so that its workers are shut down as well
+        loop = asyncio.get_running_loop()
+        stopped = loop.create_future()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, lambda: stopped.done() or stopped.set_result(None))
+            except NotImplementedError:
+                pass
+
+        async with server:
+            await stopped
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        parallel.shutdown_pool()
+        if created and _is_same_file(path, created[0]):
+            os.unlink(path)
+
+
+def _is_same_file(path, st):
+    try:
+        current = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    return (current.st_dev, current.st_ino) == (st.st_dev, st.st_ino)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='pygments-mathematica')
+    commands = parser.add_subparsers(dest='command', required=True)
+    server = commands.add_parser('serve', help='run a highlight daemon')
+    address = server.add_mutually_exclusive_group(required=True)
+    address.add_argument('--socket', help='path of the Unix socket to listen on')
+    address.add_argument('--port', type=int, help='TCP port to listen on')
+    server.add_argument('--host', default='127.0.0.1', help='TCP address to listen on')
+    server.add_argument('--workers', type=int, help='number of worker processes')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        try:
+            serve(args.socket, args.host, args.port, args.workers)
+        except FileExistsError as e:
+            parser.error(str(e))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from mathematica import serialize
+from mathematica.cache import DiskCache, TokenCache
+
+try:
+    import fcntl
+except ImportError:
+    # Without fcntl (e.g. on Windows), writes are only serialized within a process
+    fcntl = None
+
+# The file starts with a header, followed by a table of slots and a data region. The data region
+# is a ring buffer of records, and each slot points at the record of one key. A record is only
+# trusted if its key, length and checksum match the slot, so a reader never returns data that has
+# been overwritten since the slot was written. The value of a record starts with b's' for a str,
+# which is stored as UTF-8, and b'b' for bytes, as in DiskCache.
+MAGIC = b'MMASHC02'
+HEADER = struct.Struct('<8sIIQQQQ')  # magic, slots, probes, data size, seq, write position, tick
+HEADER_SIZE = 64
+SEQ_OFFSET = 24
+WRITE_POS_OFFSET = 32
+TICK_OFFSET = 40
+SLOT = struct.Struct('<16sQII')  # key, offset, length, tick
+SLOT_TICK_OFFSET = 28
+RECORD = struct.Struct('<16sII')  # key, length, checksum
+COUNTER = struct.Struct('<Q')
+EMPTY_KEY = b'\0' * 16
+
+
+class SharedCache:
+    """A cache of strings and byte strings in a memory mapped file at path that is shared by every process on
+    the host that opens the same path (e.g. pre-forked web workers). Use a path on a tmpfs such as
+    /dev/shm to keep it in memory.
+
+    Reads are lock free: they are validated with a sequence counter that writers increment before
+    and after a write, and with a checksum of each record. Writes are serialized with a file lock.
+    When the data region is full, the oldest records are overwritten, except that records which
+    are read shortly before being overwritten are moved to the front, which approximates LRU.
+
+    It can be used as the cache in mathematica.cache.highlight for rendered output, and through
+    SharedTokenCache as the cache option of MathematicaLexer.
+    """
+
+    key = staticmethod(DiskCache.key)
+
+    def __init__(self, path, size=64 * 1024 * 1024, slots=65536, probes=8):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        self._open_lock_file()
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with self._file_lock():
+                if os.fstat(fd).st_size == 0:
+                    os.ftruncate(fd, HEADER_SIZE + slots * SLOT.size + size)
+                    header = HEADER.pack(MAGIC, slots, probes, size, 0, 0, 0)
+                    os.write(fd, header)
+
+                self._map = mmap.mmap(fd, 0)
+        finally:
+            os.close(fd)
+
+        magic, self.slots, self.probes, self.size, _, _, _ = HEADER.unpack_from(self._map)
+        if magic != MAGIC or len(self._map) != HEADER_SIZE + self.slots * SLOT.size + self.size:
+            self._map.close()
+            os.close(self._fd)
+            raise ValueError('{} is not a shared cache file'.format(path))
+
+        self._data = HEADER_SIZE + self.slots * SLOT.size
+
+    def _open_lock_file(self):
+        # flock locks belong to an open file description, which a forked child shares with its
+        # parent. Each process therefore opens its own descriptor for locking.
+        if self._fd is not None:
+            os.close(self._fd)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._pid = os.getpid()
+
+    def _file_lock(self, blocking=True):
+        return _FileLock(self, blocking)
+
+    def _counter(self, offset):
+        return COUNTER.unpack_from(self._map, offset)[0]
+
+    @staticmethod
+    def _digest(key):
+        if isinstance(key, str):
+            key = key.encode('utf-8', 'surrogatepass')
+        return hashlib.blake2b(key, digest_size=16).digest()
+
+    def _probe(self, digest):
+        start = int.from_bytes(digest[:8], 'little') % self.slots
+        for i in range(self.probes):
+            index = (start + i) % self.slots
+            yield index, HEADER_SIZE + index * SLOT.size
+
+    def _find(self, digest):
+        for _, position in self._probe(digest):
+            key, offset, length, _ = SLOT.unpack_from(self._map, position)
+            if key == digest:
+                return position, offset, length
+        return None
+
+    def get(self, key):
+        digest = self._digest(key)
+        for _ in range(3):
+            seq = self._counter(SEQ_OFFSET)
+            slot = self._find(digest)
+            if slot is None:
+                break
+
+            position, offset, length = slot
+            start = self._data + offset
+            end = start + RECORD.size + length
+            if end > len(self._map):
+                break
+
+            record = self._map[start:end]
+            record_key, record_length, checksum = RECORD.unpack_from(record)
+            value = record[RECORD.size:]
+            valid = (record_key == digest and record_length == length and
+                     zlib.crc32(value) == checksum)
+            if valid and not seq & 1 and self._counter(SEQ_OFFSET) == seq:
+                tick = self._counter(TICK_OFFSET)
+                struct.pack_into('<I', self._map, position + SLOT_TICK_OFFSET, tick & 0xffffffff)
+                self._promote(digest, offset, value)
+                self.hits += 1
+                return value[1:].decode('utf-8') if value[:1] == b's' else value[1:]
+            elif not seq & 1 and self._counter(SEQ_OFFSET) == seq:
+                # Nothing was written concurrently, so the record has been overwritten
+                break
+
+        self.misses += 1
+        return None
+
+    def _promote(self, digest, offset, value):
+        # Records in the quarter of the ring buffer that will be overwritten next are written
+        # again at the front when they are read. Readers never wait for this.
+        distance = (offset - self._counter(WRITE_POS_OFFSET)) % self.size
+        if distance < self.size // 4:
+            self._set(digest, value, blocking=False)
+
+    def set(self, key, value):
+        value = b's' + value.encode('utf-8') if isinstance(value, str) else b'b' + value
+        self._set(self._digest(key), value)
+
+    def _set(self, digest, value, blocking=True):
+        record = RECORD.pack(digest, len(value), zlib.crc32(value)) + value
+        if len(record) > self.size:
+            return
+
+        with self._file_lock(blocking) as locked:
+            if not locked:
+                return
+
+            mapped = self._map
+            offset = self._counter(WRITE_POS_OFFSET)
+            if offset + len(record) > self.size:
+                offset = 0
+
+            # Use the slot of the same key or an empty slot if there is one in the probe sequence,
+            # and otherwise the least recently used slot
+            position = None
+            oldest = None
+            for _, candidate in self._probe(digest):
+                key, _, _, tick = SLOT.unpack_from(mapped, candidate)
+                if key == digest or key == EMPTY_KEY:
+                    position = candidate
+                    break
+                if oldest is None or tick < oldest[0]:
+                    oldest = (tick, candidate)
+            if position is None:
+                position = oldest[1]
+
+            seq = self._counter(SEQ_OFFSET)
+            tick = self._counter(TICK_OFFSET) + 1
+            COUNTER.pack_into(mapped, SEQ_OFFSET, seq + 1)
+            mapped[self._data + offset:self._data + offset + len(record)] = record
+            SLOT.pack_into(mapped, position, digest, offset, len(value), tick & 0xffffffff)
+            COUNTER.pack_into(mapped, WRITE_POS_OFFSET, offset + len(record))
+            COUNTER.pack_into(mapped, TICK_OFFSET, tick)
+            COUNTER.pack_into(mapped, SEQ_OFFSET, seq + 2)
+
+    def clear(self):
+        with self._file_lock():
+            seq = self._counter(SEQ_OFFSET)
+            COUNTER.pack_into(self._map, SEQ_OFFSET, seq + 1)
+            self._map[HEADER_SIZE:self._data] = b'\0' * (self._data - HEADER_SIZE)
+            COUNTER.pack_into(self._map, WRITE_POS_OFFSET, 0)
+            COUNTER.pack_into(self._map, SEQ_OFFSET, seq + 2)
+
+    def stats(self):
+        # entries and bytes count the slots in use, some of which may point at overwritten records
+        entries = size = 0
+        for i in range(self.slots):
+            key, _, length, _ = SLOT.unpack_from(self._map, HEADER_SIZE + i * SLOT.size)
+            if key != EMPTY_KEY:
+                entries += 1
+                size += RECORD.size + length
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': entries,
+            'bytes': min(size, self.size),
+            'max_bytes': self.size,
+        }
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+        self._fd = None
+
+
+class _FileLock:
+    def __init__(self, cache, blocking):
+        self.cache = cache
+        self.blocking = blocking
+        self.locked = False
+
+    def __enter__(self):
+        cache = self.cache
+        if not cache._lock.acquire(self.blocking):
+            return False
+
+        if fcntl is not None:
+            if cache._pid != os.getpid():
+                cache._open_lock_file()
+            try:
+                fcntl.flock(cache._fd, fcntl.LOCK_EX | (0 if self.blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                cache._lock.release()
+                return False
+
+        self.locked = True
+        return True
+
+    def __exit__(self, *args):
+        if self.locked:
+            if fcntl is not None:
+                fcntl.flock(self.cache._fd, fcntl.LOCK_UN)
+            self.cache._lock.release()
+
+
+class SharedTokenCache:
+    """Adapts a SharedCache for use as the cache option of MathematicaLexer."""
+
+    key = staticmethod(TokenCache.key)
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def lookup(self, key, text):
+        data = self.cache.get(key)
+        return None if data is None else serialize.loads(data, text)
+
+    def store(self, key, text, tokens):
+        self.cache.set(key, serialize.dumps(tokens))
+
+    def stats(self):
+        return self.cache.stats()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import codecs
+import os
+import re
+
+from mathematica.lexer import (NUMBER_TAILS, MathematicaAnnotations, MathematicaLexer, MToken,
+                               Regex)
+
+# Number of characters that must follow a token in the buffer for it to be lexed the same as in the
+# whole text. The rules only look ahead past the end of a match by a few characters, except across
+# whitespace, which is why chunks are only cut after whitespace. Numbers such as 16 ^^ ff and
+# 1.5 *^ 3 may span any amount of whitespace, so chunks are never cut before their tails.
+LOOKAHEAD = 64
+
+# Bytes that can't be lexed with the ASCII rules: those of non-ASCII characters, and the control
+# characters that \s only matches in str patterns
+NOT_ASCII = re.compile(b'[\x1c-\x1f\x80-\xff]')
+# The identifiers of the lexer without their non-ASCII characters, which is the only part of the
+# rules that isn't ASCII
+ASCII_IDENTIFIER = r'[a-zA-Z\$][a-zA-Z0-9\$]*'
+# The rules compiled from bytes patterns for each lexer class
+_ascii_tokens = {}
+
+
+def lex_stream(source, chunk_size=1024 * 1024, lexer=None, encoding='utf-8'):
+    """Yields the same tokens as lexer.get_tokens_unprocessed on the whole text of source, while
+    only holding about chunk_size characters of it in memory at a time. Offsets count characters
+    from the start of the text.
+
+    source is a path, a file object opened in text or binary mode, or a bytes-like object such as
+    an mmap. Bytes are decoded incrementally with encoding."""
+    if lexer is None:
+        lexer = MathematicaLexer()
+
+    ma = MathematicaAnnotations()
+    annotations = ma.annotations()
+    with _Reader(source, encoding) as reader:
+        buffer = ''
+        offset = 0
+        stack = ('root', )
+        size = chunk_size
+        eof = False
+        while not eof:
+            text = reader.read(size)
+            eof = not text
+            buffer += text
+            if not buffer:
+                break
+
+            # The buffer is lexed up to its end, but only the tokens before the last point at which
+            # the lexer state is known to be the same as in the whole text are emitted. The rest is
+            # lexed again with the next chunk, starting from that state.
+            spans = []
+            statestack = []
+            cut = None
+            last = len(buffer) - LOOKAHEAD
+            previous = None
+            for start, end, token in lexer._get_spans(buffer, stack, statestack):
+                # The whitespace of a message (as in f:: usage) is part of a match that goes on
+                if (previous is MToken.WHITESPACE and start <= last and
+                        token is not MToken.WHITESPACE and token is not MToken.MESSAGE and
+                        not buffer.startswith(NUMBER_TAILS, start)):
+                    cut = (len(spans), start, tuple(statestack))
+                spans.append((start, end, token))
+                previous = token
+
+            if eof:
+                cut = (len(spans), len(buffer), stack)
+            elif cut is None:
+                # A single token (e.g. a long string) spans the buffer, so read more at once to
+                # avoid lexing it again for every chunk
+                size *= 2
+                continue
+
+            count, position, stack = cut
+            for start, end, token in spans[:count]:
+                result = (offset + start, token, buffer[start:end])
+                for func in annotations:
+                    result = func(*result)
+                yield result
+
+            buffer = buffer[position:]
+            offset += position
+            size = chunk_size
+
+
+def lex_bytes(data, lexer=None, encoding='utf-8'):
+    """Yields the tokens of data, a bytes-like object such as an mmap, like lex_stream. When data
+    is ASCII, as notebooks usually are with non-ASCII characters escaped as \\[Name] or \\:XXXX,
+    it is lexed as bytes without being decoded, and only the values of the tokens are decoded."""
+    if lexer is None:
+        lexer = MathematicaLexer()
+
+    if u'a\n'.encode(encoding) != b'a\n' or NOT_ASCII.search(data) is not None:
+        return lex_stream(data, lexer=lexer, encoding=encoding)
+
+    tokens = _lex_ascii(data, lexer)
+    return lexer._intern_values(tokens) if lexer.intern else tokens
+
+
+def _lex_ascii(data, lexer):
+    tokendefs = _ascii_tokens.get(type(lexer))
+    if tokendefs is None:
+        # The non-ASCII alternatives of the rules can't match ASCII text, so leaving them out
+        # gives the same tokens
+        tokendefs = {}
+        for state, rules in lexer._tokens.items():
+            tokendefs[state] = []
+            for rexmatch, action, new_state in rules:
+                pattern = rexmatch.__self__.pattern.replace(Regex.IDENTIFIER, ASCII_IDENTIFIER)
+                flags = rexmatch.__self__.flags & ~re.UNICODE
+                tokendefs[state].append((re.compile(pattern.encode('ascii'), flags).match, action,
+                                         new_state))
+        _ascii_tokens[type(lexer)] = tokendefs
+
+    ma = MathematicaAnnotations()
+    annotations = ma.annotations()
+    for start, end, token in lexer._get_spans(data, ('root', ), tokendefs=tokendefs):
+        result = (start, token, str(data[start:end], 'ascii'))
+        for func in annotations:
+            result = func(*result)
+        yield result
+
+
+class _Reader:
+    def __init__(self, source, encoding):
+        self.file = None
+        self.data = None
+        self.position = 0
+        self.decoder = codecs.getincrementaldecoder(encoding)()
+        if isinstance(source, (str, os.PathLike)):
+            self.file = self.source = open(source, 'rb')
+        elif hasattr(source, 'read') and not hasattr(source, '__getitem__'):
+            self.source = source
+        else:
+            # mmap objects have read as well, but are sliced so that no state of the mmap is changed
+            self.data = memoryview(source)
+
+    def read(self, size):
+        if self.data is not None:
+            data = self.data[self.position:self.position + size]
+            self.position += len(data)
+        else:
+            data = self.source.read(size)
+            if isinstance(data, str):
+                return data
+
+        # Reading is repeated until there is text, since size bytes may not complete a character
+        text = self.decoder.decode(data, final=not data)
+        return self.read(size) if data and not text else text
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self.data is not None:
+            self.data.release()
+        if self.file is not None:
+            self.file.close()
@@ -19,6 +19,7 @@ class MathematicaStyle(Style):
         MToken.NUMBER: '#b66a4b',
         MToken.OPERATOR: '#555555',
         MToken.PATTERN: 'italic #6E8413',
+        MToken.PRIVATE: '#6d87a8',
         MToken.SLOT: 'italic #6E8413',
         MToken.STRING: '#499A9F',
         MToken.SYMBOL: '#4b78b1',
@@ -38,8 +39,17 @@ class MathematicaNotebookStyle(Style):
         MToken.NUMBER: 'bold #000000',
         MToken.OPERATOR: 'bold #000000',
         MToken.PATTERN: 'bold italic #438958',
+        MToken.PRIVATE: 'bold #002CC3',
         MToken.SLOT: 'bold italic #438958',
         MToken.STRING: 'bold #666666',
         MToken.SYMBOL: 'bold #002CC3',
         MToken.UNKNOWN: 'bold #000000',
     }
+
+
+# The styles by the names under which setup.py registers them with Pygments, which only knows them
+# by name once the package is installed
+STYLES = {
+    'mathematica': MathematicaStyle,
+    'mathematicanotebook': MathematicaNotebookStyle,
+}
@@ -9,8 +9,11 @@ It currently supports:
 
  - All builtin functions in the ``System`` context including unicode symbols like ``π`` except \
  those that use characters from the private unicode space (e.g. ``\[FormalA]``).
- - User defined symbols, including those in a context.
+ - User defined symbols, including those in a context, fully qualified builtins (e.g. \
+ ``System`Plot``) and package private symbols inside ``Begin["`Private`"]``.
  - All operators including unicode operators like ``∈`` and ``⊕``.
+ - Named characters and character codes (e.g. ``\[Pi]``, ``\[Element]`` and ``\:03b1``), \
+ highlighted like their unicode forms.
  - Comments, including multi line and nested.
  - Strings, including multi line and escaped quotes.
  - Patterns, slots (including named slots ``#name`` introduced in version 10) and slot sequences.
@@ -18,6 +21,7 @@ It currently supports:
  - Numbers including base notation (e.g. ``8 ^^ 23 == 19``) and scientific notation \
  (e.g. ``1 *^ 3 == 1000``).
  - Local variables in ``Block``, ``With`` and ``Module``.
+ - Pattern variables on the RHS of delayed definitions and rules (e.g. the ``x`` in ``f[x_] := x^2``).
 
 A Sass file containing the styles can be obtained from the package repository for use in static \
 website generators such as Jekyll, Octopress, Pelican, etc.
@@ -53,9 +57,16 @@ setup(
     ],
     packages=['mathematica'],
     install_requires=['Pygments >= 2.19'],
+    extras_require={
+        'numpy': ['numpy'],
+    },
     include_package_data=False,
     platforms=['any'],
     entry_points={
+        'console_scripts': [
+            'mma-highlight = mathematica.batch:main',
+            'pygments-mathematica = mathematica.server:main'
+        ],
         'pygments.lexers': [
             'MathematicaLexer = mathematica:MathematicaLexer'
         ],
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pygments
+from nose.tools import assert_equal, assert_true
+from pygments.formatters import HtmlFormatter
+
+from mathematica.aio import ahighlight, alex
+from mathematica.lexer import MathematicaLexer
+from mathematica.style import MathematicaStyle
+
+CODE = 'f[x_] := Module[{y = x}, y^2 + Sin[y]] (* comment *)\n' * 50
+
+
+class TestAio:
+    def setup(self):
+        self.lexer = MathematicaLexer()
+        self.formatter = HtmlFormatter(style=MathematicaStyle)
+
+    def test_alex(self):
+        async def lex():
+            ticks = []
+
+            async def tick():
+                while True:
+                    ticks.append(None)
+                    await asyncio.sleep(0)
+
+            task = asyncio.ensure_future(tick())
+            await asyncio.sleep(0)
+            before = len(ticks)
+            tokens = [token async for token in alex(CODE, tokens_per_yield=10)]
+            task.cancel()
+            return tokens, len(ticks) - before
+
+        tokens, ticks = asyncio.run(lex())
+        assert_equal(list(self.lexer.get_tokens_unprocessed(CODE)), tokens)
+        # The loop ran the other task about once per 10 tokens
+        assert_true(ticks >= len(tokens) // 10 - 1)
+
+    def test_ahighlight(self):
+        expected = pygments.highlight(CODE, self.lexer, self.formatter)
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for options in ({}, {'threshold': 0}, {'threshold': 0, 'executor': executor},
+                            {'threshold': 0, 'lexer': MathematicaLexer()}):
+                assert_equal(expected, asyncio.run(ahighlight(CODE, self.formatter, **options)))
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+from unittest import SkipTest
+
+from nose.tools import assert_equal
+
+from mathematica.arrays import lex_to_arrays, np
+from mathematica.lexer import TOKEN_TYPES, MathematicaLexer
+
+
+class TestLexToArrays:
+    def setup(self):
+        if np is None:
+            raise SkipTest('numpy is not installed')
+
+    def test_arrays(self):
+        code = 'f[x_] := Module[{y = x}, Plot[y, x]] (* comment *)\nf[1]'
+        tokens = list(MathematicaLexer().get_tokens_unprocessed(code))
+        arrays = lex_to_arrays(code)
+        assert_equal([index for index, _, _ in tokens], arrays.starts.tolist())
+        assert_equal([len(value) for _, _, value in tokens], arrays.lengths.tolist())
+        assert_equal([token for _, token, _ in tokens], [TOKEN_TYPES[i] for i in arrays.types])
+        assert_equal(['f', 'Module', 'y', 'x', 'Plot'], arrays.symbol_names.tolist())
+        assert_equal([0, 1, 2, 3, 4, 2, 3, 0],
+                     arrays.symbols[arrays.symbols >= 0].tolist())
+
+    def test_empty(self):
+        arrays = lex_to_arrays('')
+        assert_equal(0, len(arrays.starts))
+        assert_equal(0, len(arrays.symbol_names))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import io
+import json
+import os
+import shutil
+import tempfile
+from contextlib import redirect_stdout
+
+import pygments
+from nose.tools import assert_equal, assert_in
+from pygments.formatters import HtmlFormatter
+
+from mathematica.batch import MANIFEST, find_files, highlight_files, main
+from mathematica.lexer import MathematicaLexer
+from mathematica.style import MathematicaStyle
+
+
+class TestBatch:
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'src')
+        self.output = os.path.join(self.directory, 'out')
+        self.files = {
+            'a.m': 'f[x_] := x^2',
+            'b.wl': 'Plot[Sin[x], {x, 0, Pi}]',
+            os.path.join('sub', 'c.nb'): 'Notebook[{Cell["x", "Input"]}]',
+            os.path.join('sub', 'd.txt'): 'not highlighted',
+            os.path.join('.hidden', 'e.m'): 'not highlighted',
+        }
+        for name, code in self.files.items():
+            self.write(name, code)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, code):
+        path = os.path.join(self.source, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(code)
+
+    def run(self, **options):
+        stats = highlight_files([self.source], self.output, workers=1, **options)
+        return tuple(stats[key] for key in ('highlighted', 'unchanged_mtime', 'unchanged_hash'))
+
+    def test_find_files(self):
+        files = find_files([self.source, os.path.join(self.source, 'a.m')])
+        assert_equal(['a.m', 'b.wl', os.path.join('sub', 'c.nb')],
+                     [os.path.relpath(path, self.source) for _, path, _ in files])
+
+    def test_highlight(self):
+        assert_equal((3, 0, 0), self.run())
+        formatter = HtmlFormatter(style=MathematicaStyle)
+        with open(os.path.join(self.output, 'a.m.html')) as f:
+            assert_equal(pygments.highlight(self.files['a.m'], MathematicaLexer(), formatter),
+                         f.read())
+        with open(os.path.join(self.output, MANIFEST)) as f:
+            manifest = json.load(f)
+        assert_equal(3, len(manifest['files']))
+
+    def test_skip_unchanged(self):
+        self.run()
+        assert_equal((0, 3, 0), self.run())
+
+        # A file that is only touched is hashed, but not highlighted
+        path = os.path.join(self.source, 'a.m')
+        os.utime(path, ns=(0, 0))
+        assert_equal((0, 2, 1), self.run())
+
+        self.write('a.m', 'f[x_] := x^3')
+        assert_equal((1, 2, 0), self.run())
+        os.remove(os.path.join(self.output, 'b.wl.html'))
+        assert_equal((1, 2, 0), self.run())
+
+        assert_equal((3, 0, 0), self.run(force=True))
+        assert_equal((3, 0, 0), self.run(format='latex'))
+        assert_equal(True, os.path.exists(os.path.join(self.output, 'sub', 'c.nb.tex')))
+
+    def test_main(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            status = main([self.source, '-o', self.output, '-f', 'ansi', '-j', '1',
+                           '-O', 'linenos=true'])
+        assert_equal(0, status)
+        assert_in('3 files: 3 highlighted', out.getvalue())
+        assert_equal(True, os.path.exists(os.path.join(self.output, 'a.m.ansi')))
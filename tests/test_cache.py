@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from nose.tools import assert_equal, assert_is, assert_not_equal
+from pygments.formatters import HtmlFormatter
+
+from mathematica.cache import DEFAULT_TOKEN_CACHE, DiskCache, TokenCache, highlight
+from mathematica.lexer import MathematicaLexer, MToken
+from mathematica.style import MathematicaNotebookStyle, MathematicaStyle
+
+
+class TestTokenCache:
+    def setup(self):
+        self.cache = TokenCache()
+        self.lexer = MathematicaLexer(cache=self.cache)
+        self.code = 'f[x_] := Module[{y = x}, y^2] (* comment *)\n"string"'
+
+    def test_cached_tokens(self):
+        expected = list(MathematicaLexer().get_tokens(self.code))
+        assert_equal(expected, list(self.lexer.get_tokens(self.code)))
+        assert_equal(expected, list(self.lexer.get_tokens(self.code)))
+
+    def test_stats(self):
+        list(self.lexer.get_tokens(self.code))
+        list(self.lexer.get_tokens(self.code))
+        list(self.lexer.get_tokens('x'))
+        stats = self.cache.stats()
+        assert_equal((2, 1, 2), (stats['misses'], stats['hits'], stats['entries']))
+
+    def test_options_in_key(self):
+        list(self.lexer.get_tokens(self.code))
+        list(MathematicaLexer(cache=self.cache, tabsize=4).get_tokens(self.code))
+        assert_equal(2, self.cache.stats()['misses'])
+
+    def test_degraded_not_stored(self):
+        lexer = MathematicaLexer(cache=self.cache, max_tokens=3)
+        tokens = list(lexer.get_tokens(self.code))
+        assert_equal(MToken.TEXT, tokens[-1][0])
+        assert_equal(0, self.cache.stats()['entries'])
+
+        # Budgets are left out of the key, so complete tokens are shared with unbounded lexers
+        list(MathematicaLexer(cache=self.cache, max_tokens=1000).get_tokens(self.code))
+        list(self.lexer.get_tokens(self.code))
+        assert_equal((1, 1), (self.cache.stats()['entries'], self.cache.stats()['hits']))
+
+    def test_eviction(self):
+        lexer = MathematicaLexer(cache=TokenCache(max_bytes=500))
+        for i in range(10):
+            list(lexer.get_tokens('{}'.format(i) * 20))
+
+        stats = lexer.cache.stats()
+        assert_equal(True, 0 < stats['bytes'] <= 500)
+        assert_equal(10, stats['entries'] + stats['evictions'])
+
+    def test_threads(self):
+        code = ['f[x_] := x^{}'.format(i % 20) for i in range(400)]
+        expected = [list(MathematicaLexer().get_tokens(c)) for c in code]
+        lexer = MathematicaLexer(cache=TokenCache(max_bytes=5000))
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            assert_equal(expected, list(pool.map(lambda c: list(lexer.get_tokens(c)), code)))
+
+        stats = lexer.cache.stats()
+        assert_equal(True, stats['bytes'] <= 5000)
+        assert_equal(True, stats['hits'] > 0)
+
+    def test_default_cache(self):
+        assert_is(DEFAULT_TOKEN_CACHE, MathematicaLexer(cache=True).cache)
+        assert_is(DEFAULT_TOKEN_CACHE, MathematicaLexer(cache='true').cache)
+        assert_equal(False, MathematicaLexer(cache='false').cache)
+
+
+class TestDiskCache:
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = DiskCache(self.directory, max_bytes=4000)
+        self.formatter = HtmlFormatter(style=MathematicaStyle)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_highlight(self):
+        code = 'Plot[Sin[x], {x, 0, 2 Pi}]'
+        expected = highlight(code, self.formatter)
+        assert_equal(expected, highlight(code, self.formatter, cache=self.cache))
+        assert_equal(expected, highlight(code, self.formatter, cache=self.cache))
+        assert_equal((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_degraded_not_stored(self):
+        code = 'Plot[Sin[x], {x, 0, 2 Pi}]'
+        degraded = []
+        lexer = MathematicaLexer(max_tokens=3, on_degrade=lambda *args: degraded.append(args))
+        highlight(code, self.formatter, cache=self.cache, lexer=lexer)
+        assert_equal(1, len(degraded))
+        assert_equal(0, self.cache.stats()['bytes'])
+
+        expected = highlight(code, self.formatter)
+        lexer = MathematicaLexer(max_tokens=1000)
+        assert_equal(expected, highlight(code, self.formatter, cache=self.cache, lexer=lexer))
+        assert_equal(expected, highlight(code, self.formatter, cache=self.cache))
+        assert_equal(1, self.cache.hits)
+
+    def test_key(self):
+        key = self.cache.key('x', self.formatter)
+        assert_equal(key, self.cache.key('x', HtmlFormatter(style=MathematicaStyle)))
+        assert_not_equal(key, self.cache.key('y', self.formatter))
+        assert_not_equal(key, self.cache.key('x', HtmlFormatter(style=MathematicaNotebookStyle)))
+        assert_not_equal(key, self.cache.key('x', HtmlFormatter(style=MathematicaStyle, linenos=True)))
+
+    def test_bytes(self):
+        self.cache.set('0123', b'\x00\x01')
+        assert_equal(b'\x00\x01', self.cache.get('0123'))
+
+    def test_eviction(self):
+        for i in range(20):
+            highlight('f[x_] := x^{}'.format(i), self.formatter, cache=self.cache)
+
+        files = [name for _, _, names in os.walk(self.directory) for name in names]
+        assert_equal(True, self.cache.stats()['bytes'] <= 4000)
+        assert_equal(20, len(files) + self.cache.evictions)
+        assert_equal([], [name for name in files if name.startswith('.tmp-')])
@@ -2,11 +2,14 @@
 # Copyright (c) 2016 rsmenon
 # Licensed under the MIT License (https://opensource.org/licenses/MIT)
 
-from nose.tools import assert_equal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from nose.tools import assert_equal, assert_raises
 from pygments.token import Token
 
 import mathematica.builtins as mma
-from mathematica.lexer import MathematicaLexer, MToken
+from mathematica.lexer import BUILTIN_VALUES, MathematicaAnnotations, MathematicaLexer, MToken
 
 
 class TestMathematicaLexer:
@@ -213,6 +216,35 @@ class TestMathematicaLexer:
         expected = [[(MToken.SYMBOL, sym)] for sym in code]
         self.verify_all(code, expected)
 
+    def test_named_characters(self):
+        code = [r'\[Pi]', r'\[Element]', r'\[LeftDoubleBracket]', r'\[Alpha]', r'\[FormalA]']
+        expected = [
+            [(MToken.BUILTIN, r'\[Pi]')],
+            [(MToken.OPERATOR, r'\[Element]')],
+            [(MToken.GROUP, r'\[LeftDoubleBracket]')],
+            [(MToken.SYMBOL, r'\[Alpha]')],
+            [(MToken.SYMBOL, r'\[FormalA]')],
+        ]
+        self.verify_all(code, expected)
+
+    def test_character_codes(self):
+        code = [r'\:03c0', r'\:2208', r'\:301A', r'\.b0', r'\|01d504', r'\:0041', r'\:0021', r'\x',
+                r'\|ffffff', r'\|110000']
+        expected = [
+            [(MToken.BUILTIN, r'\:03c0')],
+            [(MToken.OPERATOR, r'\:2208')],
+            [(MToken.GROUP, r'\:301A')],
+            [(MToken.BUILTIN, r'\.b0')],
+            [(MToken.SYMBOL, r'\|01d504')],
+            [(MToken.SYMBOL, r'\:0041')],
+            [(MToken.UNKNOWN, r'\:0021')],
+            [(MToken.UNKNOWN, '\\'), (MToken.SYMBOL, 'x')],
+            # Beyond the last code point
+            [(MToken.UNKNOWN, r'\|ffffff')],
+            [(MToken.UNKNOWN, r'\|110000')],
+        ]
+        self.verify_all(code, expected)
+
     def test_lexical_scope_simple(self):
         code = [
             'Block[{x = 1}, Sin[x]]',
@@ -389,6 +421,182 @@ class TestMathematicaLexer:
         ]
         self.verify(code, expected)
 
+    def test_pattern_scope(self):
+        code = [
+            'f[x_, y_] := x + y',
+            '{a_ :> a^2, a}',
+            'g[x_] := x; x',
+            'h[n_Integer] :=\n  n\nn',
+            'f[x_] := x\ng[y_] := y',
+        ]
+        expected = [
+            [
+                (MToken.SYMBOL, 'f'),
+                (MToken.GROUP, '['),
+                (MToken.PATTERN, 'x_'),
+                (MToken.GROUP, ','),
+                (MToken.WHITESPACE, ' '),
+                (MToken.PATTERN, 'y_'),
+                (MToken.GROUP, ']'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.OPERATOR, ':='),
+                (MToken.WHITESPACE, ' '),
+                (MToken.LOCAL_SCOPE, 'x'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.OPERATOR, '+'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.LOCAL_SCOPE, 'y'),
+            ],
+            [
+                (MToken.GROUP, '{'),
+                (MToken.PATTERN, 'a_'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.OPERATOR, ':>'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.LOCAL_SCOPE, 'a'),
+                (MToken.OPERATOR, '^'),
+                (MToken.NUMBER, '2'),
+                (MToken.GROUP, ','),
+                (MToken.WHITESPACE, ' '),
+                (MToken.SYMBOL, 'a'),
+                (MToken.GROUP, '}'),
+            ],
+            [
+                (MToken.SYMBOL, 'g'),
+                (MToken.GROUP, '['),
+                (MToken.PATTERN, 'x_'),
+                (MToken.GROUP, ']'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.OPERATOR, ':='),
+                (MToken.WHITESPACE, ' '),
+                (MToken.LOCAL_SCOPE, 'x'),
+                (MToken.OPERATOR, ';'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.SYMBOL, 'x'),
+            ],
+            [
+                (MToken.SYMBOL, 'h'),
+                (MToken.GROUP, '['),
+                (MToken.PATTERN, 'n_Integer'),
+                (MToken.GROUP, ']'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.OPERATOR, ':='),
+                (MToken.WHITESPACE, '\n  '),
+                (MToken.LOCAL_SCOPE, 'n'),
+                (MToken.WHITESPACE, '\n'),
+                (MToken.SYMBOL, 'n'),
+            ],
+            [
+                (MToken.SYMBOL, 'f'),
+                (MToken.GROUP, '['),
+                (MToken.PATTERN, 'x_'),
+                (MToken.GROUP, ']'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.OPERATOR, ':='),
+                (MToken.WHITESPACE, ' '),
+                (MToken.LOCAL_SCOPE, 'x'),
+                (MToken.WHITESPACE, '\n'),
+                (MToken.SYMBOL, 'g'),
+                (MToken.GROUP, '['),
+                (MToken.PATTERN, 'y_'),
+                (MToken.GROUP, ']'),
+                (MToken.WHITESPACE, ' '),
+                (MToken.OPERATOR, ':='),
+                (MToken.WHITESPACE, ' '),
+                (MToken.LOCAL_SCOPE, 'y'),
+            ],
+        ]
+        self.verify_all(code, expected)
+
+    def test_pattern_scope_nested(self):
+        code = 'f[x_] := Module[{y = x}, {x, y}] /. z_ :> x + z'
+        expected = [
+            (MToken.SYMBOL, 'f'),
+            (MToken.GROUP, '['),
+            (MToken.PATTERN, 'x_'),
+            (MToken.GROUP, ']'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.OPERATOR, ':='),
+            (MToken.WHITESPACE, ' '),
+            (MToken.BUILTIN, 'Module'),
+            (MToken.GROUP, '['),
+            (MToken.GROUP, '{'),
+            (MToken.LOCAL_SCOPE, 'y'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.OPERATOR, '='),
+            (MToken.WHITESPACE, ' '),
+            (MToken.LOCAL_SCOPE, 'x'),
+            (MToken.GROUP, '}'),
+            (MToken.GROUP, ','),
+            (MToken.WHITESPACE, ' '),
+            (MToken.GROUP, '{'),
+            (MToken.LOCAL_SCOPE, 'x'),
+            (MToken.GROUP, ','),
+            (MToken.WHITESPACE, ' '),
+            (MToken.LOCAL_SCOPE, 'y'),
+            (MToken.GROUP, '}'),
+            (MToken.GROUP, ']'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.OPERATOR, '/.'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.PATTERN, 'z_'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.OPERATOR, ':>'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.LOCAL_SCOPE, 'x'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.OPERATOR, '+'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.LOCAL_SCOPE, 'z'),
+        ]
+        self.verify(code, expected)
+
+    def test_contexts(self):
+        code = ('BeginPackage["Foo`"]\nfoo\nBegin["`Private`"]\n'
+                'foo + bar + System`Plot + Foo`Private`baz\nEnd[]\nEndPackage[]\nbar')
+        expected = [
+            (MToken.BUILTIN, 'BeginPackage'),
+            (MToken.GROUP, '['),
+            (MToken.STRING, '"'),
+            (MToken.STRING, 'Foo`'),
+            (MToken.STRING, '"'),
+            (MToken.GROUP, ']'),
+            (MToken.WHITESPACE, '\n'),
+            (MToken.SYMBOL, 'foo'),
+            (MToken.WHITESPACE, '\n'),
+            (MToken.BUILTIN, 'Begin'),
+            (MToken.GROUP, '['),
+            (MToken.STRING, '"'),
+            (MToken.STRING, '`Private`'),
+            (MToken.STRING, '"'),
+            (MToken.GROUP, ']'),
+            (MToken.WHITESPACE, '\n'),
+            (MToken.SYMBOL, 'foo'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.OPERATOR, '+'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.PRIVATE, 'bar'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.OPERATOR, '+'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.BUILTIN, 'System`Plot'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.OPERATOR, '+'),
+            (MToken.WHITESPACE, ' '),
+            (MToken.PRIVATE, 'Foo`Private`baz'),
+            (MToken.WHITESPACE, '\n'),
+            (MToken.BUILTIN, 'End'),
+            (MToken.GROUP, '['),
+            (MToken.GROUP, ']'),
+            (MToken.WHITESPACE, '\n'),
+            (MToken.BUILTIN, 'EndPackage'),
+            (MToken.GROUP, '['),
+            (MToken.GROUP, ']'),
+            (MToken.WHITESPACE, '\n'),
+            (MToken.SYMBOL, 'bar'),
+        ]
+        self.verify(code, expected)
+
     def test_string_closing_quote_on_newline(self):
         code = '"test string\n"abc'
         expected = [
@@ -417,8 +625,95 @@ class TestMathematicaLexer:
                 (MToken.WHITESPACE, ' '),
                 (MToken.OPERATOR, ':='),
                 (MToken.WHITESPACE, ' '),
-                (MToken.SYMBOL, 'Δx'),
+                (MToken.LOCAL_SCOPE, 'Δx'),
             ],
             [(MToken.PATTERN, 'a∂_')],
         ]
-        self.verify_all(code, expected)
\ No newline at end of file
+        self.verify_all(code, expected)
+
+    def test_fingerprint(self):
+        fingerprint = MathematicaLexer.fingerprint()
+        assert_equal(fingerprint, MathematicaLexer.fingerprint())
+        assert_equal(32, len(fingerprint))
+
+        version = MathematicaAnnotations.version
+        try:
+            MathematicaLexer._fingerprint = None
+            MathematicaAnnotations.version = version + 1
+            assert_equal(False, fingerprint == MathematicaLexer.fingerprint())
+        finally:
+            MathematicaLexer._fingerprint = None
+            MathematicaAnnotations.version = version
+
+    def test_token_spans(self):
+        code = ('BeginPackage["Foo`"]\nBegin["`Private`"]\n(* comment *)\n'
+                'f[x_] := Module[{y = x}, y + \\[Pi] + General::foo]\nEnd[]\nEndPackage[]\n')
+        expected = [(index, index + len(value), token)
+                    for index, token, value in self.lexer.get_tokens_unprocessed(code)]
+        assert_equal(expected, list(self.lexer.get_token_spans(code)))
+
+    def test_intern(self):
+        code = 'Plot[abc, abc] + Plot[abc, abc]'
+        lexer = MathematicaLexer(intern=True)
+        tokens = list(lexer.get_tokens(code))
+        assert_equal(list(self.lexer.get_tokens(code)), tokens)
+
+        plots = [value for _, value in tokens if value == 'Plot']
+        assert_equal([True, True], [value is BUILTIN_VALUES['Plot'] for value in plots])
+        symbols = [value for _, value in tokens if value == 'abc']
+        assert_equal([True] * 4, [value is symbols[0] for value in symbols])
+
+        lexer = MathematicaLexer(intern=True, intern_size=0)
+        symbols = [value for _, value in lexer.get_tokens(code) if value == 'abc']
+        assert_equal(False, symbols[0] is symbols[1])
+
+    def test_threads(self):
+        # The rules of a lexer class are compiled when its first instance is created, which may
+        # happen in several threads at once
+        class Lexer(MathematicaLexer):
+            pass
+
+        code = ['f[x_] := Module[{{y = x}}, y^{} + \\[Alpha]]'.format(i) for i in range(200)]
+        expected = [list(self.lexer.get_tokens(c)) for c in code]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            lexers = list(pool.map(lambda _: Lexer(), range(8)))
+            assert_equal([expected[0]] * 8, [list(lexer.get_tokens(code[0])) for lexer in lexers])
+
+            lexer = MathematicaLexer(intern=True)
+            assert_equal(expected, list(pool.map(lambda c: list(lexer.get_tokens(c)), code)))
+
+    def test_immutable_tables(self):
+        assert_raises(AttributeError, getattr, mma.SYSTEM_SYMBOLS, 'add')
+        assert_raises(AttributeError, getattr, mma.NAMED_CHARACTERS, '__setitem__')
+
+    def test_budget(self):
+        code = 'f[x_] := Module[{y = x}, y^2] (* comment *)\n' * 20
+        expected = list(self.lexer.get_tokens_unprocessed(code))
+        degraded = []
+        lexer = MathematicaLexer(max_tokens=10, on_degrade=lambda *args: degraded.append(args))
+        tokens = list(lexer.get_tokens_unprocessed(code))
+        assert_equal(expected[:10] + [(expected[10][0], MToken.TEXT, code[expected[10][0]:])],
+                     tokens)
+        assert_equal([(expected[10][0], 'max_tokens')], degraded)
+
+        # Budgets that aren't exceeded leave the tokens unchanged
+        assert_equal(expected, list(MathematicaLexer(max_tokens=1000, deadline_ms=60000)
+                                    .get_tokens_unprocessed(code)))
+
+        tokens = list(MathematicaLexer(deadline_ms=1e-6).get_tokens_unprocessed(code))
+        assert_equal([(0, MToken.TEXT, code)], tokens)
+
+    def test_cancel(self):
+        code = 'f[x_] := Module[{y = x}, y^2] (* comment *)\n' * 20
+        cancel = threading.Event()
+        degraded = []
+        lexer = MathematicaLexer(cancel=cancel, on_degrade=lambda *args: degraded.append(args))
+        tokens = lexer.get_tokens_unprocessed(code)
+        first = [next(tokens) for _ in range(100)]
+        cancel.set()
+        rest = list(tokens)
+        assert_equal(list(self.lexer.get_tokens_unprocessed(code))[:len(first) + len(rest) - 1],
+                     first + rest[:-1])
+        assert_equal(MToken.TEXT, rest[-1][1])
+        assert_equal(code, ''.join(value for _, _, value in first + rest))
+        assert_equal([(rest[-1][0], 'cancelled')], degraded)
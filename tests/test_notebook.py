@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+
+import pygments
+from nose.tools import assert_equal
+from pygments.formatters import HtmlFormatter
+
+from mathematica.cache import DiskCache
+from mathematica.lexer import MathematicaLexer
+from mathematica.notebook import (INDEX_SUFFIX, cell_code, flatten_boxes, highlight_cell,
+                                  highlight_notebook, index_cells, index_notebook, lex_notebook,
+                                  load_index, rehighlight_notebook, scan_cells)
+from mathematica.parallel import shutdown_pool
+
+NOTEBOOK = r'''(* Content-type: application/vnd.wolfram.mathematica *)
+
+Notebook[{
+Cell[CellGroupData[{
+Cell["Section [1]", "Section"],
+Cell[BoxData[
+ RowBox[{"f", "[", RowBox[{"x_", "]"}], ":=", "x"}]], "Input",
+ CellLabel->"In[1]:="],
+Cell[BoxData[GraphicsBox[{RGBColor[1, 0, 0], Disk[{0, 0}]}]], "Output"],
+Cell[BoxData[GraphicsBox[RasterBox[CompressedData["
+1:eJzt0DEBAAAAwqD1T20ND6AA]]]]
+"]]]], "Output"],
+Cell[TextData[{"Some ", Cell[BoxData[FormBox["x", TraditionalForm]]], " (* text"}], "Text"],
+Cell["g[y_] := y^2 (* [ *)", "Code"]
+}, Open  ]]
+},
+WindowSize->{808, 911}
+]
+(* Internal cache information: Cell[ (* nested *) *)
+'''
+
+
+class TestNotebook:
+    def setup(self):
+        self.lexer = MathematicaLexer()
+
+    def test_scan_cells(self):
+        cells = list(scan_cells(NOTEBOOK))
+        assert_equal(['Section', 'Input', 'Output', 'Output', None, 'Text', 'Code', None],
+                     [cell.style for cell in cells])
+        for cell in cells:
+            assert_equal('Cell[', NOTEBOOK[cell.start:cell.start + 5])
+            assert_equal(']', NOTEBOOK[cell.end - 1])
+        assert_equal('"Section [1]"', NOTEBOOK[cells[0].content_start:cells[0].content_end])
+        assert_equal('CellGroupData[{', NOTEBOOK[cells[-1].content_start:][:15])
+
+    def test_bytes(self):
+        expected = list(scan_cells(NOTEBOOK))
+        data = NOTEBOOK.encode('ascii')
+        assert_equal(expected, list(scan_cells(data)))
+        assert_equal(expected, list(scan_cells(memoryview(data))))
+
+        fd, path = tempfile.mkstemp(suffix='.nb')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                assert_equal(list(lex_notebook(NOTEBOOK)), list(lex_notebook(mapped)))
+                mapped.close()
+        finally:
+            os.unlink(path)
+
+    def test_lex_notebook(self):
+        cells = list(lex_notebook(NOTEBOOK))
+        assert_equal(['Input', 'Code'], [cell.style for cell, _ in cells])
+        for cell, tokens in cells:
+            code = cell_code(NOTEBOOK, cell)
+            assert_equal([(code.source(index), token, value)
+                          for index, token, value in self.lexer.get_tokens_unprocessed(code.text)],
+                         tokens)
+            for index, _, value in tokens:
+                assert_equal(value[0], NOTEBOOK[index])
+
+        assert_equal('f[x_]:=x', cell_code(NOTEBOOK, cells[0][0]).text)
+        code = cell_code(NOTEBOOK, cells[1][0])
+        assert_equal('g[y_] := y^2 (* [ *)', code.text)
+        assert_equal(NOTEBOOK.index('g[y_]'), code.source(0))
+
+    def test_flatten_boxes(self):
+        def flatten(boxes):
+            return flatten_boxes('BoxData[{}]'.format(boxes)).text
+
+        assert_equal('x^(n+1)+(a+b)/c', flatten(
+            'RowBox[{SuperscriptBox["x", RowBox[{"n", "+", "1"}]], "+", '
+            'FractionBox[RowBox[{"a", "+", "b"}], "c"]}]'))
+        assert_equal('Sqrt[x]+Surd[8, 3]+Subscript[x, i]^2', flatten(
+            'RowBox[{SqrtBox["x"], "+", RadicalBox["8", "3"], "+", '
+            'SubsuperscriptBox["x", "i", "2"]}]'))
+        assert_equal('{{a, b}, {c, d}}', flatten(
+            'GridBox[{{"a", "b"}, {"c", "d"}}, GridBoxAlignment->{"Columns" -> {{Left}}}]'))
+        # Options of boxes are left out, and boxes that aren't known are written as they are
+        assert_equal('x y', flatten(
+            'StyleBox[RowBox[{"x", " ", "y"}], FontColor->RGBColor[1, 0, 0]]'))
+        assert_equal('Show[GraphicsBox[Disk[{0, 0}]]]', flatten(
+            'RowBox[{"Show", "[", GraphicsBox[Disk[{0, 0}]], "]"}]'))
+        # Strings are unescaped, except for named characters, which the lexer reads
+        assert_equal('a=1\nPrint["hi"]+\\[Alpha]', flatten(
+            r'{RowBox[{"a", "=", "1"}], "\[IndentingNewLine]", '
+            r'RowBox[{"Print", "[", "\"\<hi\>\"", "]", "+", "\[Alpha]"}]}'))
+
+    def test_flatten_offsets(self):
+        boxes = r'BoxData[RowBox[{"Print", "[", "\"hi\"", "]", "+", SuperscriptBox["é", "2"]}]]'
+        code = flatten_boxes(boxes)
+        assert_equal('Print["hi"]+é^2', code.text)
+        # Characters of strings map to themselves, and escapes and the characters that are added
+        # map to the boxes they come from
+        assert_equal([boxes.index('Print'), boxes.index('\\"hi'), boxes.index('hi'),
+                      boxes.index('é'), boxes.index(', "2"'), boxes.index('2"')],
+                     [code.source(code.text.index(c)) for c in 'P"hé^2'])
+
+        # Offsets of bytes are in bytes
+        data = boxes.encode('utf-8')
+        assert_equal(code.text, flatten_boxes(data).text)
+        assert_equal(data.index(b'2"'), flatten_boxes(data).source(len(code.text) - 1))
+
+        tokens = list(self.lexer.get_tokens_unprocessed(code.text))
+        assert_equal([(code.source(index), token, value) for index, token, value in tokens],
+                     list(code.map_tokens(tokens)))
+
+    def test_flatten_deep(self):
+        # Boxes are flattened without recursion
+        depth = 100000
+        code = flatten_boxes('RowBox[{"a", ' * depth + '"b"' + '}]' * depth)
+        assert_equal('a' * depth + 'b', code.text)
+        assert_equal(depth * len('RowBox[{"a", ') + 1, code.source(depth))
+
+    def test_highlight_notebook(self):
+        formatter = HtmlFormatter()
+        code = 'g[y_] := y^2 (* [ *)'
+        cell, output = list(highlight_notebook(NOTEBOOK, formatter))[1]
+        assert_equal(pygments.highlight(code, self.lexer, formatter), output)
+        assert_equal(['Input'], [cell.style for cell, _ in highlight_notebook(
+            NOTEBOOK, formatter, styles=('Input', ))])
+
+
+class TestIndex:
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'notebook.nb')
+        self.data = NOTEBOOK.encode('ascii')
+        with open(self.path, 'wb') as f:
+            f.write(self.data)
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_index_cells(self):
+        cells = index_cells(self.data)
+        assert_equal(sorted(scan_cells(self.data)), [cell[:5] for cell in cells])
+        section = cells[1]
+        assert_equal(hashlib.blake2b(self.data[section.start:section.end], digest_size=16)
+                     .hexdigest(), section.hash)
+
+        # Changing a cell changes its hash and that of its group only, even if the other cells move
+        changed = index_cells(self.data.replace(b'"x"}]], "Input"', b'"x^2"}]], "Input"'))
+        assert_equal([True, False, True, False, False, False, False, False],
+                     [a.hash != b.hash for a, b in zip(cells, changed)])
+
+    def test_save_and_load(self):
+        assert_equal(None, load_index(self.path))
+        with open(self.path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            cells = index_notebook(self.path, mapped)
+            assert_equal(True, os.path.exists(self.path + INDEX_SUFFIX))
+            assert_equal(cells, load_index(self.path))
+            assert_equal(cells, index_notebook(self.path, mapped))
+
+            formatter = HtmlFormatter()
+            code = [cell for cell in cells if cell.style == 'Code'][0]
+            assert_equal(pygments.highlight('g[y_] := y^2 (* [ *)', MathematicaLexer(), formatter),
+                         highlight_cell(mapped, code, formatter))
+            mapped.close()
+
+        # The index of a notebook that has changed is out of date
+        with open(self.path, 'ab') as f:
+            f.write(b'\n')
+        assert_equal(None, load_index(self.path))
+
+    def test_rehighlight(self):
+        cache = DiskCache(os.path.join(self.directory, 'cache'))
+        formatter = HtmlFormatter()
+
+        def highlight(data, **options):
+            results = rehighlight_notebook(data, formatter, cache, **options)
+            assert_equal([(cell[:5], output) for cell, output in highlight_notebook(data, formatter)],
+                         [(cell[:5], output) for cell, output in results])
+
+        try:
+            highlight(self.data, workers=2)
+        finally:
+            shutdown_pool()
+        assert_equal((0, 2), (cache.hits, cache.misses))
+        highlight(self.data, cells=index_cells(self.data))
+        assert_equal((2, 2), (cache.hits, cache.misses))
+
+        # Only the cell that changed is highlighted again
+        highlight(self.data.replace(b'"x"}]], "Input"', b'"x^2"}]], "Input"'), workers=1)
+        assert_equal((3, 3), (cache.hits, cache.misses))
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pygments
+from nose.tools import assert_equal, assert_raises
+from pygments.formatters import HtmlFormatter, NullFormatter
+
+from mathematica import parallel
+from mathematica.lexer import MathematicaLexer
+from mathematica.style import MathematicaStyle
+
+CODE = '''BeginPackage["Foo`"]
+
+foo::usage = "foo[x] does\n\nsomething."
+
+Begin["`Private`"]
+
+foo[x_] := Module[{y = x},
+
+    y^2 + bar[y]
+]
+
+(* a comment
+
+   with (* nested *) blank lines *)
+bar[x_] :=
+
+    x + 1
+
+baz = 16
+
+^^ff
+
+End[]
+
+EndPackage[]
+'''
+
+
+class TestParallel:
+    def setup(self):
+        self.lexer = MathematicaLexer()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def teardown(self):
+        self.executor.shutdown()
+
+    def verify(self, text, **options):
+        options.setdefault('executor', self.executor)
+        expected = list(self.lexer.get_tokens_unprocessed(text))
+        assert_equal(parallel.parallel_lex(text, min_chunk_size=16, **options), expected)
+
+    def test_split_points(self):
+        points = parallel.split_points(CODE)
+        assert_equal([CODE[point:point + 10] for point in points], [
+            'foo::usage',
+            'Begin["`Pr',
+            'foo[x_] :=',
+            '(* a comme',
+            'baz = 16\n\n',
+            'End[]\n\nEnd',
+            'EndPackage',
+        ])
+
+    def test_parallel_lex(self):
+        self.verify(CODE)
+        self.verify(CODE * 10)
+        self.verify(CODE * 10, workers=2, executor=None)
+
+    def test_serial(self):
+        # Short texts, texts without split points and a single worker are lexed serially
+        self.verify('f[x_] := x')
+        self.verify('f[x_] :=\n\n' * 100)
+        self.verify(CODE * 10, workers=1, executor=None)
+
+    def test_intern(self):
+        lexer = MathematicaLexer(intern=True)
+        tokens = parallel.parallel_lex(CODE * 10, lexer=lexer, executor=self.executor,
+                                       min_chunk_size=16)
+        assert_equal(tokens, list(self.lexer.get_tokens_unprocessed(CODE * 10)))
+
+    def test_fallback(self):
+        # A chunk that doesn't end in the initial state of the lexer is lexed again, together with
+        # the rest of the text
+        text = 'f[x_] := Module[{y},\n\n y + x]\n\ng[x_] := x\n\n' * 10
+        chunks = parallel._chunks
+        parallel._chunks = lambda text, *args: [(0, 21), (21, 100), (100, len(text))]
+        try:
+            self.verify(text)
+        finally:
+            parallel._chunks = chunks
+
+
+class CountingCache(dict):
+    key = staticmethod(lambda code, formatter, lexer=None: code)
+
+    def __init__(self):
+        dict.__init__(self)
+        self.sets = 0
+
+    def set(self, key, value):
+        self[key] = value
+        self.sets += 1
+
+
+class TestHighlightMany:
+    def setup(self):
+        self.lexer = MathematicaLexer()
+        self.snippets = ['f[x_] := x^2', 'Plot[Sin[x], {x, 0, 1}]', 'f[x_] := x^2', '(* a *) a',
+                         'f[x_] := x^2']
+
+    def teardown(self):
+        parallel.shutdown_pool()
+
+    def verify(self, formatter, *args, **options):
+        expected = [pygments.highlight(code, self.lexer, HtmlFormatter(style=MathematicaStyle))
+                    for code in self.snippets]
+        assert_equal(list(parallel.highlight_many(self.snippets, formatter, *args, **options)),
+                     expected)
+
+    def test_highlight_many(self):
+        self.verify(HtmlFormatter(style=MathematicaStyle), workers=2)
+        self.verify(HtmlFormatter, MathematicaStyle, workers=2, chunksize=1)
+        self.verify('html', MathematicaStyle, workers=1)
+
+    def test_pool(self):
+        pool = parallel.get_pool(2)
+        assert_equal(parallel.get_pool(2), pool)
+        list(parallel.highlight_many(self.snippets, NullFormatter(), workers=2))
+        assert_equal(parallel.get_pool(2), pool)
+
+    def test_cache(self):
+        cache = CountingCache()
+        formatter = HtmlFormatter(style=MathematicaStyle)
+        self.verify(formatter, workers=1, cache=cache)
+        assert_equal(cache.sets, 3)
+        self.verify(formatter, workers=1, cache=cache)
+        assert_equal(cache.sets, 3)
+
+    def test_style_with_instance(self):
+        assert_raises(ValueError, parallel.highlight_many, self.snippets, NullFormatter(),
+                      MathematicaStyle)
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import gc
+
+from nose.tools import assert_in, assert_is_not_none, assert_true
+
+import mathematica
+from mathematica.lexer import MathematicaLexer
+
+
+class TestPreload:
+    def test_preload(self):
+        mathematica.preload()
+        assert_in('_tokens', MathematicaLexer.__dict__)
+        assert_is_not_none(MathematicaLexer._fingerprint)
+
+    def test_freeze(self):
+        try:
+            mathematica.preload(freeze=True)
+            assert_true(gc.get_freeze_count() > 0)
+        finally:
+            gc.unfreeze()
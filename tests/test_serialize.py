@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import pickle
+
+from nose.tools import assert_equal, assert_raises, assert_true
+
+from mathematica import serialize
+from mathematica.lexer import MathematicaLexer, MToken
+
+
+class TestSerialize:
+    def setup(self):
+        self.lexer = MathematicaLexer()
+
+    def verify(self, text, tokens):
+        assert_equal(tokens, serialize.loads(serialize.dumps(tokens), text))
+
+    def test_round_trip(self):
+        text = ('BeginPackage["Foo`"]\nf[x_] := Module[{y = x}, y^2 + \\[Pi]]\n'
+                '(* a long comment that does not fit in a nibble *)\n' + 'x' * 70000)
+        self.verify(text, list(self.lexer.get_tokens_unprocessed(text)))
+
+    def test_empty(self):
+        self.verify('', [])
+
+    def test_gaps(self):
+        text = '  abc     ' + 'x' * 300
+        self.verify(text, [(2, MToken.SYMBOL, 'abc'), (10, MToken.STRING, 'x' * 300)])
+
+    def test_size(self):
+        with open(__file__) as f:
+            text = f.read()
+        tokens = list(self.lexer.get_tokens_unprocessed(text))
+        pickled = pickle.dumps(tokens, protocol=pickle.HIGHEST_PROTOCOL)
+        assert_true(len(serialize.dumps(tokens)) * 10 < len(pickled))
+
+    def test_invalid(self):
+        data = serialize.dumps(list(self.lexer.get_tokens_unprocessed('f[x]')))
+        assert_raises(ValueError, serialize.loads, b'X' + data[1:], 'f[x]')
+        assert_raises(ValueError, serialize.loads, data[:-1], 'f[x]')
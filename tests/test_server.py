@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import stat
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pygments
+from nose.tools import assert_equal, assert_in, assert_raises, assert_true
+from pygments.formatters import HtmlFormatter, LatexFormatter
+
+from mathematica.lexer import MathematicaLexer
+from mathematica.parallel import shutdown_pool
+from mathematica.server import start_server
+from mathematica.style import MathematicaStyle
+
+
+class TestServer:
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'socket')
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def teardown(self):
+        self.executor.shutdown()
+        shutil.rmtree(self.directory)
+
+    def exchange(self, lines, **options):
+        # Sends all the lines before reading any response
+        async def run():
+            server = await start_server(executor=options.pop('executor', self.executor), **options)
+            async with server:
+                if 'path' in options:
+                    reader, writer = await asyncio.open_unix_connection(options['path'])
+                else:
+                    port = server.sockets[0].getsockname()[1]
+                    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+                writer.write_eof()
+                responses = [json.loads(line) for line in (await reader.read()).splitlines()]
+                writer.close()
+                return responses
+
+        return asyncio.run(run())
+
+    def test_pipelining(self):
+        codes = ['f[x_] := x^{}'.format(i) for i in range(50)]
+        requests = [json.dumps({'id': i, 'code': code, 'options': {'style': 'mathematica'}})
+                    for i, code in enumerate(codes)]
+        responses = self.exchange(requests, path=self.path)
+
+        formatter = HtmlFormatter(style=MathematicaStyle)
+        assert_equal(list(range(50)), [response['id'] for response in responses])
+        assert_equal([pygments.highlight(code, MathematicaLexer(), formatter) for code in codes],
+                     [response['output'] for response in responses])
+        timing = responses[0]['timing']
+        assert_true(0 <= timing['highlight_ms'] <= timing['total_ms'])
+
+    def test_options(self):
+        code = 'Plot[Sin[x], {x, 0, 2 Pi}]'
+        request = {'code': code, 'formatter': 'latex', 'lexer_options': {'max_tokens': 3}}
+        response, = self.exchange([json.dumps(request)], port=0)
+        lexer = MathematicaLexer(max_tokens=3)
+        assert_equal(pygments.highlight(code, lexer, LatexFormatter()), response['output'])
+
+    def test_errors(self):
+        responses = self.exchange(['{"id": 1', '', '{"id": 2}', '[]',
+                                   '{"id": 3, "code": "x", "formatter": "nope"}',
+                                   '{"id": 4, "code": "x"}'], path=self.path)
+        assert_equal([None, 2, None, 3, 4], [response['id'] for response in responses])
+        for response in responses[:4]:
+            assert_in('error', response)
+        assert_in('output', responses[4])
+
+    def test_bad_response(self):
+        # A request whose response can't be written gets an error, and the requests after it on
+        # the same connection are still answered
+        responses = self.exchange([
+            json.dumps({'id': 1, 'code': 'x'}),
+            json.dumps({'id': 2, 'code': 'x\ud800'}),
+            json.dumps({'id': 3, 'code': 'x', 'options': {'encoding': 'utf-8'}}),
+            json.dumps({'id': 4, 'code': 'y'})], path=self.path)
+        assert_equal([1, 2, 3, 4], [response['id'] for response in responses])
+        assert_in('UnicodeEncodeError', responses[1]['error'])
+        assert_in('error', responses[2])
+        assert_equal(pygments.highlight('y', MathematicaLexer(), HtmlFormatter()),
+                     responses[3]['output'])
+
+    def test_refused_options(self):
+        # Options that would write files on the server are refused
+        css = os.path.join(self.directory, 'style.css')
+        responses = self.exchange([
+            json.dumps({'id': 1, 'code': 'x', 'options': {'full': True, 'cssfile': css}}),
+            json.dumps({'id': 2, 'code': 'x', 'formatter': 'img',
+                        'options': {'font_name': '/etc/passwd'}}),
+            json.dumps({'id': 3, 'code': 'x', 'options': {'linenos': True}}),
+            json.dumps({'id': 4, 'code': 'x', 'lexer_options': {'cache': True, 'tabsize': 4}}),
+            json.dumps({'id': 5, 'code': 'x', 'lexer_options': {'stripall': True}})],
+            path=self.path)
+        assert_equal([1, 2, 3, 4, 5], [response['id'] for response in responses])
+        assert_in('options not allowed: cssfile, full', responses[0]['error'])
+        assert_in('formatter must be one of', responses[1]['error'])
+        assert_in('output', responses[2])
+        assert_in('lexer_options not allowed: cache, tabsize', responses[3]['error'])
+        assert_in('output', responses[4])
+        assert_equal(False, os.path.exists(css))
+
+    def test_socket_permissions(self):
+        async def run():
+            server = await start_server(self.path, executor=self.executor)
+            server.close()
+            await server.wait_closed()
+            return stat.S_IMODE(os.stat(self.path).st_mode)
+
+        assert_equal(0o600, asyncio.run(run()))
+
+    def test_existing_path(self):
+        # A stale socket is replaced, but a file that isn't a socket is left alone
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(self.path)
+        stale.close()
+        response, = self.exchange(['{"code": "x"}'], path=self.path)
+        assert_in('output', response)
+
+        path = os.path.join(self.directory, 'file')
+        with open(path, 'w') as f:
+            f.write('data')
+        assert_raises(FileExistsError, asyncio.run, start_server(path, executor=self.executor))
+        with open(path) as f:
+            assert_equal('data', f.read())
+
+    def test_process_pool(self):
+        try:
+            response, = self.exchange(['{"code": "x"}'], path=self.path, workers=1, executor=None)
+        finally:
+            shutdown_pool()
+        assert_equal(pygments.highlight('x', MathematicaLexer(), HtmlFormatter()),
+                     response['output'])
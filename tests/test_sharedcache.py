@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import os
+import shutil
+import tempfile
+
+import pygments
+from nose.tools import assert_equal, assert_is_none, assert_raises
+from pygments.formatters import HtmlFormatter
+
+from mathematica.cache import highlight
+from mathematica.lexer import MathematicaLexer
+from mathematica.sharedcache import SharedCache, SharedTokenCache
+
+
+class TestSharedCache:
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache')
+        self.cache = SharedCache(self.path, size=4096, slots=64)
+
+    def teardown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def test_get_set(self):
+        assert_is_none(self.cache.get('foo'))
+        self.cache.set('foo', b'bar')
+        assert_equal(b'bar', self.cache.get('foo'))
+        self.cache.set('foo', b'baz')
+        assert_equal(b'baz', self.cache.get('foo'))
+        self.cache.set('foo', u'α')
+        assert_equal(u'α', self.cache.get('foo'))
+        self.cache.set('foo', b'')
+        assert_equal(b'', self.cache.get('foo'))
+
+    def test_highlight(self):
+        code = 'f[x_] := x^2'
+        formatter = HtmlFormatter()
+        output = highlight(code, formatter, cache=self.cache)
+        assert_equal(output, highlight(code, formatter, cache=self.cache))
+        assert_equal(pygments.highlight(code, MathematicaLexer(), formatter), output)
+        assert_equal((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_shared_between_processes(self):
+        pid = os.fork()
+        if not pid:
+            SharedCache(self.path).set('foo', b'bar')
+            os._exit(0)
+
+        os.waitpid(pid, 0)
+        assert_equal(b'bar', self.cache.get('foo'))
+
+    def test_eviction(self):
+        for i in range(100):
+            self.cache.set('key{}'.format(i), b'x' * 100)
+
+        assert_is_none(self.cache.get('key0'))
+        assert_equal(b'x' * 100, self.cache.get('key99'))
+
+    def test_recently_used_entries_are_kept(self):
+        for i in range(10):
+            self.cache.set('key{}'.format(i), b'x' * 200)
+        for i in range(100):
+            self.cache.get('key0')
+            self.cache.set('other{}'.format(i), b'y' * 200)
+
+        assert_equal(b'x' * 200, self.cache.get('key0'))
+        assert_is_none(self.cache.get('key1'))
+
+    def test_token_cache(self):
+        code = 'f[x_] := Module[{y = x}, y^2] (* comment *)'
+        lexer = MathematicaLexer(cache=SharedTokenCache(self.cache))
+        expected = list(MathematicaLexer().get_tokens(code))
+        assert_equal(expected, list(lexer.get_tokens(code)))
+        assert_equal(expected, list(lexer.get_tokens(code)))
+        assert_equal(1, self.cache.hits)
+
+    def test_invalid_file(self):
+        path = os.path.join(self.directory, 'invalid')
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 100)
+        assert_raises(ValueError, SharedCache, path)
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# Copyright (c) 2016 rsmenon
+# Licensed under the MIT License (https://opensource.org/licenses/MIT)
+
+import io
+import mmap
+import os
+import tempfile
+
+from nose.tools import assert_equal, assert_in
+
+from mathematica.lexer import MathematicaLexer
+from mathematica import stream
+from mathematica.stream import lex_bytes, lex_stream
+
+CODE = u'''BeginPackage["Foo`"]
+foo::usage = "foo[x] does
+something with α."
+Begin["`Private`"]
+foo[x_] := Module[{y = x \\[Alpha]}, y^2 + 16 ^^ ff + 1.5 *^ 3]
+(* a (* nested *) comment that is a bit longer than the others, so that it spans chunks *)
+bar = "''' + 'x' * 300 + u'''"
+End[]
+EndPackage[]
+'''
+
+
+class TestLexStream:
+    def setup(self):
+        self.expected = list(MathematicaLexer().get_tokens_unprocessed(CODE))
+
+    def verify(self, source, **options):
+        assert_equal(self.expected, list(lex_stream(source, **options)))
+
+    def test_text_file(self):
+        for chunk_size in (1, 10, 100, 10000):
+            self.verify(io.StringIO(CODE), chunk_size=chunk_size)
+
+    def test_binary_file(self):
+        for chunk_size in (1, 10, 100, 10000):
+            self.verify(io.BytesIO(CODE.encode('utf-8')), chunk_size=chunk_size)
+
+    def test_path_and_mmap(self):
+        fd, path = tempfile.mkstemp(suffix='.m')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(CODE.encode('utf-8'))
+            self.verify(path, chunk_size=50)
+
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.verify(mapped, chunk_size=50)
+                mapped.close()
+        finally:
+            os.unlink(path)
+
+    def test_empty(self):
+        assert_equal([], list(lex_stream(io.StringIO(''))))
+
+    def test_number_tails(self):
+        # Numbers span any amount of whitespace before their tails, more than LOOKAHEAD
+        for code in ('a = 1.5 *^' + ' ' * 200 + '3\n', 'a = 16 ^^' + ' ' * 200 + 'ff\n',
+                     'a = 1.5' + ' ' * 200 + '*^3\n'):
+            expected = list(MathematicaLexer().get_tokens_unprocessed(code))
+            for chunk_size in (10, 100):
+                assert_equal(expected, list(lex_stream(io.StringIO(code), chunk_size=chunk_size)))
+
+
+class TestLexBytes:
+    def verify(self, text, **options):
+        expected = list(MathematicaLexer(**options).get_tokens_unprocessed(text))
+        data = text.encode('utf-8')
+        for source in (data, bytearray(data), memoryview(data)):
+            assert_equal(expected, list(lex_bytes(source, lexer=MathematicaLexer(**options))))
+
+    def test_ascii(self):
+        self.verify(CODE.replace(u'α', u'\\[Alpha]'))
+        self.verify(u'f::\n usage\n(* \\:03b1 \\.41 *)\n"a\\\n\n"\tx\x01 ')
+        self.verify(CODE.replace(u'α', u'\\[Alpha]'), intern=True)
+        assert_in(MathematicaLexer, stream._ascii_tokens)
+
+    def test_not_ascii(self):
+        # Text that isn't ASCII, or has control characters that \s only matches in str patterns,
+        # is decoded
+        self.verify(CODE)
+        self.verify(u'a\x1cb')